@@ -0,0 +1,134 @@
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from collections import OrderedDict
+from enum import Enum
+
+from version import __version__
+
+logger = logging.getLogger('CACHE')
+
+# The cache used by the generators. Stays None (no caching) until configure() is called
+cache = None
+
+def cache_key(generator_id, settings, grid, export_format, quality=None):
+    """Calculate the key of a generated model. Any change to the inputs of a generator,
+       including the version of the creator itself, results in a different key
+    """
+    description = {
+        "version": __version__,
+        "generator": generator_id,
+        "settings": dataclasses.asdict(settings),
+        "grid": dataclasses.asdict(grid),
+        "format": export_format,
+        "quality": quality,
+    }
+
+    # Settings may contain enums. The forms set the name of the member instead, which is the same model
+    serialized = json.dumps(description, sort_keys=True, default=lambda value: value.name if isinstance(value, Enum) else str(value))
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+class ArtifactCache:
+    """Disk-backed cache of generated model files. The total size of the cached files is kept
+       below a quota by evicting the least recently used files first
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.entries = OrderedDict() # Maps key to file size, least recently used first
+        self.lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self.scan()
+
+    def scan(self):
+        """Index the files left behind by a previous run, oldest first"""
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.startswith("."):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name, stat.st_size))
+
+        for _, key, size in sorted(files):
+            self.entries[key] = size
+            self.total_bytes += size
+
+        self.evict()
+        logger.info("Artifact cache contains {0} files ({1} bytes)".format(len(self.entries), self.total_bytes))
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def contains(self, key):
+        """Return whether there is a cached file for key"""
+        with self.lock:
+            return key in self.entries
+
+    def get(self, key):
+        """Open the cached file for key and return it, or None if it is not in the cache. The file is opened
+           with the lock held, so it can still be read when it is evicted before the caller is done with it
+        """
+        with self.lock:
+            if key not in self.entries:
+                return None
+
+            self.entries.move_to_end(key)
+            path = self.path(key)
+
+            try:
+                reader = open(path, 'rb')
+            except FileNotFoundError:
+                # Removed behind our back
+                self.total_bytes -= self.entries.pop(key)
+                return None
+
+            # Persist the recency so the LRU order survives a restart
+            os.utime(path)
+            return reader
+
+    def put(self, key, data):
+        """Store data under key"""
+        # Write to a temporary file first, so a half-written file is never served
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path(key))
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+        with self.lock:
+            if key in self.entries:
+                self.total_bytes -= self.entries.pop(key)
+
+            self.entries[key] = len(data)
+            self.total_bytes += len(data)
+            self.evict()
+
+    def evict(self):
+        """Remove the least recently used files until the cache fits its quota. Must be called with the lock held
+           (or before the cache is shared)
+        """
+        while self.total_bytes > self.max_bytes and self.entries:
+            key, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+
+            try:
+                os.remove(self.path(key))
+                logger.debug("Evicted {0}".format(key))
+            except FileNotFoundError:
+                pass
+
+def configure(directory, max_bytes):
+    """Enable the artifact cache"""
+    global cache
+    cache = ArtifactCache(directory, max_bytes)
+    return cache
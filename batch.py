@@ -0,0 +1,318 @@
+import csv
+import dataclasses
+import io
+import logging
+import math
+import time
+import zipfile
+
+from concurrent.futures import FIRST_COMPLETED, wait
+from enum import Enum
+
+import cost_model
+import job_pool
+import metrics
+
+from generators.common import threemf
+from generators.common.model_download import get_cached_model, store_model, submit_model
+from generators.common.model_export import DEFAULT_QUALITY, EXPORT_FORMATS, QUALITY_PRESETS
+
+logger = logging.getLogger('BATCH')
+
+# Limits on the size of a single batch
+MAX_BATCH_ENTRIES = 100
+MAX_QUANTITY = 1000
+
+TRUE_VALUES = ("1", "true", "yes", "y", "on")
+
+class BatchError(Exception):
+    """Raised when a batch request can't be processed because it is invalid"""
+
+@dataclasses.dataclass
+class BatchItem:
+    """A unique model in a batch, with the total quantity requested"""
+    job: object
+    quantity: int
+
+def convert_number(value):
+    """Convert a value from the request to a finite float. Raises ValueError or TypeError if it isn't a number"""
+    if isinstance(value, bool):
+        raise TypeError("Not a number")
+
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError("Not a finite number")
+
+    return number
+
+def convert_int(value):
+    """Convert a value from the request to an int, refusing fractions. Raises ValueError or TypeError if it isn't one"""
+    number = convert_number(value)
+    if not number.is_integer():
+        raise ValueError("Not a whole number")
+
+    return int(number)
+
+def convert_value(value, default):
+    """Convert a value from the request to the type of the default value of the setting"""
+    if isinstance(default, bool):
+        if isinstance(value, str):
+            return value.strip().lower() in TRUE_VALUES
+        return bool(value)
+    if isinstance(default, int):
+        return convert_int(value)
+    if isinstance(default, float):
+        return convert_number(value)
+    if isinstance(default, Enum):
+        # The forms set the name of the member, so the same model always has the same settings
+        for member in type(default):
+            if str(value).strip().upper() in (member.name, str(member.value).upper()):
+                return member.name
+        raise ValueError("Unknown choice")
+    return str(value)
+
+def check_ranges(s, grid):
+    """Refuse settings that the generators can't make a model of. Sizes and counts must be at least 1 and within
+       the limits of the grid, all other numbers must be positive
+    """
+    maxCompartments = grid.MAX_COMPARTMENTS_PER_GRID_UNIT*grid.MAX_GRID_UNITS
+    limits = {
+        "sizeUnitsX": (1, grid.MAX_GRID_UNITS),
+        "sizeUnitsY": (1, grid.MAX_GRID_UNITS),
+        "sizeUnitsZ": (1, grid.MAX_HEIGHT_UNITS),
+        "compartmentsX": (1, maxCompartments),
+        "compartmentsY": (1, maxCompartments),
+        "numHolesX": (1, None),
+        "numHolesY": (1, None),
+    }
+
+    for field in dataclasses.fields(s):
+        value = getattr(s, field.name)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+
+        if field.name not in limits:
+            if value <= 0:
+                raise BatchError("Setting '{0}' must be greater than 0".format(field.name))
+            continue
+
+        low, high = limits[field.name]
+        if value < low or (high is not None and value > high):
+            if high is None:
+                raise BatchError("Setting '{0}' must be at least {1}".format(field.name, low))
+            raise BatchError("Setting '{0}' must be between {1} and {2}".format(field.name, low, int(high)))
+
+def settings_from_values(settings_class, values, grid):
+    """Construct a settings object, replacing the defaults with the provided values. Raises BatchError
+       if a value is invalid or out of range for the grid
+    """
+    s = settings_class()
+    fields = {field.name for field in dataclasses.fields(s)}
+
+    for name, value in values.items():
+        if name not in fields:
+            raise BatchError("Unknown setting '{0}'".format(name))
+        try:
+            setattr(s, name, convert_value(value, getattr(s, name)))
+        except (TypeError, ValueError, OverflowError):
+            raise BatchError("Invalid value '{0}' for setting '{1}'".format(value, name))
+
+    check_ranges(s, grid)
+    return s
+
+def parse_json(data):
+    """Parse a batch in JSON format: a list of objects with the fields "generator", "quantity" (optional, default 1),
+       "format" (optional, default "stl"), "quality" (optional, the tessellation of STL files, default "auto") and
+       "settings" (optional, an object with the settings that differ from the defaults)
+    """
+    if not isinstance(data, list):
+        raise BatchError("Expected a list of entries")
+
+    entries = []
+    for entry in data:
+        if not isinstance(entry, dict) or "generator" not in entry:
+            raise BatchError("Each entry needs at least a generator")
+        if not isinstance(entry.get("settings", {}), dict):
+            raise BatchError("The settings of an entry must be an object")
+        if not all(isinstance(entry.get(name, ""), str) for name in ("generator", "format", "quality")):
+            raise BatchError("The generator, format and quality of an entry must be strings")
+        entries.append((entry["generator"], entry.get("settings", {}), entry.get("quantity", 1), entry.get("format", "stl"),
+                        entry.get("quality", DEFAULT_QUALITY)))
+
+    return entries
+
+def parse_csv(text):
+    """Parse a batch in CSV format. The first line names the columns: "generator", "quantity", "format" and "quality" as for JSON,
+       plus one column for each setting. Empty cells keep the default value of the setting
+    """
+    entries = []
+    for row in csv.DictReader(io.StringIO(text)):
+        values = {name.strip(): value.strip() for name, value in row.items() if name and value and value.strip()}
+
+        if "generator" not in values:
+            raise BatchError("Each entry needs at least a generator")
+
+        generator_id = values.pop("generator")
+        quantity = values.pop("quantity", 1)
+        export_format = values.pop("format", "stl")
+        quality = values.pop("quality", DEFAULT_QUALITY)
+        entries.append((generator_id, values, quantity, export_format, quality))
+
+    return entries
+
+def parse_request(request):
+    """Extract the entries of a batch from a request with a JSON or CSV body"""
+    if request.is_json:
+        entries = parse_json(request.get_json(silent=True))
+    elif "file" in request.files:
+        entries = parse_csv(request.files["file"].read().decode("utf-8"))
+    else:
+        entries = parse_csv(request.get_data(as_text=True))
+
+    if not entries:
+        raise BatchError("The batch is empty")
+
+    return entries
+
+def create_items(entries, generators, constants):
+    """Create the jobs of the entries in a batch. Identical models are combined into a single item"""
+    items = {}
+
+    for generator_id, values, quantity, export_format, quality in entries:
+        if generator_id not in generators:
+            raise BatchError("Unknown generator '{0}'".format(generator_id))
+        if export_format not in EXPORT_FORMATS:
+            raise BatchError("Unknown export format '{0}'".format(export_format))
+        if quality != "auto" and quality not in QUALITY_PRESETS:
+            raise BatchError("Unknown quality '{0}'".format(quality))
+
+        try:
+            quantity = convert_int(quantity)
+        except (TypeError, ValueError):
+            raise BatchError("Invalid quantity '{0}'".format(quantity))
+        if quantity < 1 or quantity > MAX_QUANTITY:
+            raise BatchError("Quantity must be between 1 and {0}".format(MAX_QUANTITY))
+
+        gen = generators[generator_id]
+        job = gen.create_job(settings_from_values(gen.settings.Settings, values, constants), constants, export_format, quality)
+
+        # Refuse the whole batch up front, instead of failing halfway through the ZIP file
+        try:
+            cost_model.check(job)
+        except cost_model.CostLimitError as ex:
+            raise BatchError("{0}: {1}".format(job.download_name, ex))
+
+        key = job.cache_key()
+        if key in items:
+            items[key].quantity += quantity
+        else:
+            items[key] = BatchItem(job, quantity)
+
+    if len(items) > MAX_BATCH_ENTRIES:
+        raise BatchError("A batch may contain at most {0} different models".format(MAX_BATCH_ENTRIES))
+
+    return list(items.values())
+
+class ZipStream(io.RawIOBase):
+    """Write-only stream that collects the output of a ZipFile, so it can be sent while it is being written"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.chunks.append(bytes(b))
+        return len(b)
+
+    def take(self):
+        """Return everything written since the previous call"""
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def unique_name(name, names):
+    """Make the file name unique within the archive"""
+    base, dot, extension = name.rpartition(".")
+    candidate = name
+    counter = 2
+    while candidate in names:
+        candidate = "{0} ({1}).{2}".format(base, counter, extension)
+        counter += 1
+
+    names.add(candidate)
+    return candidate
+
+def submit(item):
+    """Start generating the model of an item. Waits for room in the queue of the pool if it is full"""
+    while True:
+        try:
+            # Batches are bulk work, they leave the fast lane to interactive requests for small models
+            return submit_model(item.job, job_pool.BULK_LANE)
+        except job_pool.QueueFullError:
+            time.sleep(1)
+
+def generate_zip(items):
+    """Generate the models of all items, in parallel, and yield a ZIP archive containing them as they complete"""
+    stream = ZipStream()
+    archive = zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_DEFLATED)
+    names = set()
+    manifest = [("quantity", "file", "generator")]
+
+    def add(item, data):
+        # A 3MF file can place the same object several times, so it contains all copies of the model
+        if item.job.export_format == "3mf" and item.quantity > 1:
+            data = threemf.replicate(data, item.quantity)
+
+        name = unique_name("{0}x {1}".format(item.quantity, item.job.download_name), names)
+        archive.writestr(name, data)
+        manifest.append((item.quantity, name, item.job.generator_id))
+
+    parallel = job_pool.pool.lane_workers(job_pool.BULK_LANE) if job_pool.pool else 1
+    waiting = []
+    running = {}
+
+    # Cached models don't have to be generated
+    for item in items:
+        reader = get_cached_model(item.job)
+        if reader:
+            metrics.models.inc(item.job.generator_id, "cache")
+            with reader:
+                add(item, reader.read())
+            yield stream.take()
+        else:
+            waiting.append(item)
+
+    try:
+        while waiting or running:
+            # Keep as many jobs running as there are workers in the bulk lane, so a batch doesn't fill up the queue for everyone else
+            while waiting and len(running) < parallel:
+                item = waiting.pop(0)
+                running[submit(item)] = item
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = running.pop(future)
+                try:
+                    data = future.result()
+                except Exception as ex:
+                    logger.error("Failed to generate {0}: {1}".format(item.job.download_name, ex))
+                    manifest.append((item.quantity, "FAILED: " + item.job.download_name, item.job.generator_id))
+                    continue
+
+                store_model(item.job, data)
+                add(item, data)
+                yield stream.take()
+    finally:
+        # Only left running when the client disconnected before the batch was complete
+        for future in running:
+            future.abort()
+
+    # Add a list of all models and their quantities
+    lines = io.StringIO()
+    csv.writer(lines).writerows(manifest)
+    archive.writestr("bill of materials.csv", lines.getvalue())
+
+    archive.close()
+    yield stream.take()
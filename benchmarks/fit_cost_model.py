@@ -0,0 +1,100 @@
+"""Fit the cost model (cost_model.py) to the results of the generator benchmark.
+
+For every generator, the time to generate and export a model and the peak memory use are fitted as a linear function
+of the features of its settings, using the cases in benchmarks/baseline.json. The coefficients are written to
+cost_model.json, and the prediction for each case is reported next to its measurement. Run from the root of the
+repository, after storing new benchmark results with `python benchmarks/generators.py --save`:
+
+    python benchmarks/fit_cost_model.py
+    python benchmarks/fit_cost_model.py --dry-run   only report the fit, don't write the coefficients
+"""
+import argparse
+import importlib
+import importlib.util
+import json
+import os
+import sys
+
+sys.path.insert(0, os.getcwd())
+
+import numpy as np
+
+import cost_model
+import grid_constants
+
+BENCHMARK = os.path.join(os.path.dirname(os.path.abspath(__file__)), "generators.py")
+
+def load_benchmark():
+    # The benchmark script is named like the generators package, so it is loaded from its path
+    spec = importlib.util.spec_from_file_location("generator_benchmark", BENCHMARK)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def validated_settings(generator, settings):
+    """Return the settings of a case as the generator uses them, after its validation"""
+    sys.path.insert(0, os.path.join(os.getcwd(), "generators", generator))
+
+    generatorModule = importlib.import_module(generator + "_generator")
+    settingsModule = importlib.import_module(generator + "_settings")
+
+    return generatorModule.Generator(settingsModule.Settings(**settings), grid_constants.Grid()).settings
+
+def fit(features, measured):
+    """Least-squares fit of measured = intercept + features @ weights, where neither the intercept nor the weights
+       are negative: no model is free, and a part that is added more often never makes a model cheaper.
+       Returns the intercept followed by the weights
+    """
+    matrix = np.column_stack([np.ones(len(features)), features])
+    active = list(range(matrix.shape[1]))
+    while True:
+        weights = np.zeros(matrix.shape[1])
+        weights[active] = np.linalg.lstsq(matrix[:, active], measured, rcond=None)[0]
+        if (weights >= 0).all():
+            return weights.tolist()
+
+        # Leave out the term with the most negative weight and fit again
+        active.remove(int(np.argmin(weights)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit the cost model to the benchmark results")
+    parser.add_argument("--dry-run", action="store_true", help="only report the fit, don't write the coefficients")
+    args = parser.parse_args()
+
+    benchmark = load_benchmark()
+    with open(benchmark.BASELINE, 'r') as reader:
+        baseline = json.load(reader)
+
+    cases = {}
+    for name, generator, settings in benchmark.get_cases():
+        if name in baseline and generator in cost_model.FEATURES:
+            cases.setdefault(generator, []).append((name, cost_model.features(generator, validated_settings(generator, settings))))
+
+    model = {}
+    print("{0:<32} {1:>9} {2:>9} {3:>8} {4:>8}".format("case", "time", "predicted", "RSS", "predicted"))
+
+    for generator, generatorCases in sorted(cases.items()):
+        features = np.array([values for _, values in generatorCases], dtype=float)
+        seconds = np.array([baseline[name]["generate"] + baseline[name]["export"] for name, _ in generatorCases])
+        memory = np.array([baseline[name]["rss_mb"] for name, _ in generatorCases])
+
+        model[generator] = {
+            "features": list(cost_model.FEATURES[generator]),
+            "seconds": [round(value, 6) for value in fit(features, seconds)],
+            "memory_mb": [round(value, 4) for value in fit(features, memory)],
+        }
+
+        for (name, values), time, rss in zip(generatorCases, seconds, memory):
+            print("{0:<32} {1:>8.2f}s {2:>8.2f}s {3:>6.0f}MB {4:>6.0f}MB".format(name, time,
+                  cost_model.predict(values, model[generator]["seconds"]), rss, cost_model.predict(values, model[generator]["memory_mb"])))
+
+    if not args.dry_run:
+        with open(cost_model.COEFFICIENTS_FILE, 'w') as writer:
+            json.dump(model, writer, indent=2, sort_keys=True)
+            writer.write("\n")
+        print("Stored the cost model of {0} generators in {1}".format(len(model), cost_model.COEFFICIENTS_FILE))
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
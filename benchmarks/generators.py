@@ -0,0 +1,183 @@
+"""Benchmark of all generators over a matrix of settings.
+
+Every case runs in a fresh process, so it starts without cached shapes and its peak memory use can be measured.
+For each case, the time to generate the model, the time to export it to STL, the peak RSS of the process and the
+number of triangles in the STL file are reported and compared with the stored baseline. Run from the root of the
+repository:
+
+    python benchmarks/generators.py                  run all cases and compare them with the baseline
+    python benchmarks/generators.py classicbin-3x3   only run the cases whose name contains one of the arguments
+    python benchmarks/generators.py --save           store the results as the new baseline
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# A case is slower or faster than the baseline when its time differs by more than this fraction
+TIME_TOLERANCE = 0.25
+
+def bin_cases(generator, defaults, sizes, heights, variants):
+    """Cases for one of the bins: all sizes at the default height, all heights at 2x2 and the variants at 3x2"""
+    cases = []
+    for x, y in sizes:
+        cases.append(("{0}-{1}x{2}".format(generator, x, y), dict(defaults, sizeUnitsX=x, sizeUnitsY=y)))
+    for z in heights:
+        cases.append(("{0}-2x2-height{1}".format(generator, z), dict(defaults, sizeUnitsX=2, sizeUnitsY=2, sizeUnitsZ=z)))
+    for name, settings in variants:
+        cases.append(("{0}-3x2-{1}".format(generator, name), dict(defaults, sizeUnitsX=3, sizeUnitsY=2, **settings)))
+    return cases
+
+def get_cases():
+    """Return the benchmark cases as (name, generator, settings)"""
+    sizes = [(1, 1), (2, 2), (3, 3), (4, 4), (6, 6), (8, 8), (10, 10)]
+    heights = [2, 12, 20]
+    noHoles = {"addMagnetHoles": False, "addScrewHoles": False}
+
+    cases = []
+
+    for name, settings in bin_cases("classicbin", {"sizeUnitsZ": 6, "compartmentsX": 2, "compartmentsY": 2}, sizes, heights, [
+            ("1x1compartments", {"compartmentsX": 1, "compartmentsY": 1}),
+            ("4x4compartments", {"compartmentsX": 4, "compartmentsY": 4}),
+            ("8x2compartments", {"compartmentsX": 8, "compartmentsY": 2}),
+            ("12x8compartments", {"compartmentsX": 12, "compartmentsY": 8}),
+            ("multilabel", {"compartmentsX": 3, "compartmentsY": 3, "multiLabel": True}),
+            ("plain", {"addStackingLip": False, "addGrabCurve": False, "addLabelRidge": False}),
+            ("noholes", noHoles),
+            ("removalholes", {"addRemovalHoles": True}),
+        ]):
+        cases.append((name, "classicbin", settings))
+    cases.append(("classicbin-6x6-24x24compartments", "classicbin", {"sizeUnitsX": 6, "sizeUnitsY": 6, "sizeUnitsZ": 6, "compartmentsX": 24, "compartmentsY": 24}))
+
+    for name, settings in bin_cases("lightbin", {"sizeUnitsZ": 6}, sizes, heights, [
+            ("4x4compartments", {"compartmentsX": 4, "compartmentsY": 4}),
+            ("multilabel", {"compartmentsX": 3, "compartmentsY": 3, "multiLabel": True}),
+            ("plain", {"addStackingLip": False, "addLabelRidge": False}),
+        ]):
+        cases.append((name, "lightbin", settings))
+
+    for name, settings in bin_cases("solidbin", {"sizeUnitsZ": 6}, sizes, heights, [
+            ("noholes", noHoles),
+            ("removalholes", {"addRemovalHoles": True}),
+        ]):
+        cases.append((name, "solidbin", settings))
+
+    for shape in ("CIRCLE", "SQUARE", "HEXAGON"):
+        cases.append(("holeybin-1x1-3x3{0}".format(shape.lower()), "holeybin", {"holeShape": shape}))
+    cases.append(("holeybin-2x2-6x6holes", "holeybin", {"sizeUnitsX": 2, "sizeUnitsY": 2, "numHolesX": 6, "numHolesY": 6}))
+    cases.append(("holeybin-4x4-12x12holes", "holeybin", {"sizeUnitsX": 4, "sizeUnitsY": 4, "numHolesX": 12, "numHolesY": 12}))
+    cases.append(("holeybin-4x4-20x20holes", "holeybin", {"sizeUnitsX": 4, "sizeUnitsY": 4, "numHolesX": 20, "numHolesY": 20}))
+    cases.append(("holeybin-6x6-6x6holes", "holeybin", {"numHolesX": 6, "numHolesY": 6, "keepoutDiameter": 40.0}))
+    cases.append(("holeybin-6x6-30x30hexagon", "holeybin", {"numHolesX": 30, "numHolesY": 30, "keepoutDiameter": 8.0, "holeSize": 5.0, "holeShape": "HEXAGON"}))
+    cases.append(("holeybin-2x2-noholes", "holeybin", dict(noHoles, sizeUnitsX=2, sizeUnitsY=2)))
+
+    for x, y in sizes:
+        cases.append(("baseplate-{0}x{1}".format(x, y), "baseplate", {"sizeUnitsX": x, "sizeUnitsY": y}))
+
+    return cases
+
+def run_case(generator, settings):
+    """Generate and export a single model in this process and return the measurements"""
+    sys.path.insert(0, os.getcwd())
+    sys.path.insert(0, os.path.join(os.getcwd(), "generators", generator))
+
+    import importlib
+    import grid_constants
+    from generators.common.model_export import export_to_bytes
+
+    generatorModule = importlib.import_module(generator + "_generator")
+    settingsModule = importlib.import_module(generator + "_settings")
+
+    gen = generatorModule.Generator(settingsModule.Settings(**settings), grid_constants.Grid())
+
+    start = time.perf_counter()
+    model = gen.generate_model()
+    generateTime = time.perf_counter() - start
+
+    start = time.perf_counter()
+    data = export_to_bytes(model, "stl")
+    exportTime = time.perf_counter() - start
+
+    return {
+        "generate": round(generateTime, 3),
+        "export": round(exportTime, 3),
+        # ru_maxrss is in kB on Linux
+        "rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        # A binary STL file has an 84 byte header followed by 50 bytes per triangle
+        "triangles": (len(data) - 84) // 50,
+    }
+
+def measure(generator, settings):
+    """Run a case in a fresh process and return its measurements"""
+    command = [sys.executable, __file__, "--case", json.dumps([generator, settings])]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def compare(value, baseline):
+    """Describe the difference between a time and its baseline"""
+    if baseline is None:
+        return "new"
+
+    ratio = value / baseline if baseline else 1.0
+    if ratio > 1 + TIME_TOLERANCE:
+        return "{0:.2f}x SLOWER".format(ratio)
+    if ratio < 1 - TIME_TOLERANCE:
+        return "{0:.2f}x faster".format(ratio)
+    return "{0:.2f}x".format(ratio)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the generators")
+    parser.add_argument("filters", nargs="*", help="only run the cases whose name contains one of these")
+    parser.add_argument("--save", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--repeat", type=int, default=1, help="run each case this many times and keep the fastest")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        generator, settings = json.loads(args.case)
+        print(json.dumps(run_case(generator, settings)))
+        return 0
+
+    baseline = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE, 'r') as reader:
+            baseline = json.load(reader)
+
+    cases = [case for case in get_cases() if not args.filters or any(f in case[0] for f in args.filters)]
+
+    print("{0:<32} {1:>9} {2:>9} {3:>8} {4:>10}   {5:<16} {6:<16} {7}".format(
+        "case", "generate", "export", "RSS", "triangles", "generate vs base", "export vs base", "triangles vs base"))
+
+    results = {}
+    slower = 0
+    for name, generator, settings in cases:
+        runs = [measure(generator, settings) for _ in range(args.repeat)]
+        result = min(runs, key=lambda r: r["generate"] + r["export"])
+        results[name] = result
+
+        base = baseline.get(name, {})
+        generateChange = compare(result["generate"], base.get("generate"))
+        exportChange = compare(result["export"], base.get("export"))
+        triangleChange = "" if "triangles" not in base else "{0:+d}".format(result["triangles"] - base["triangles"])
+        slower += "SLOWER" in generateChange or "SLOWER" in exportChange
+
+        print("{0:<32} {1:>8.2f}s {2:>8.2f}s {3:>6.0f}MB {4:>10}   {5:<16} {6:<16} {7}".format(
+            name, result["generate"], result["export"], result["rss_mb"], result["triangles"], generateChange, exportChange, triangleChange), flush=True)
+
+    if args.save:
+        # Keep the baseline of the cases that were not run
+        baseline.update(results)
+        with open(BASELINE, 'w') as writer:
+            json.dump(baseline, writer, indent=2, sort_keys=True)
+            writer.write("\n")
+        print("Stored the results of {0} cases in {1}".format(len(results), BASELINE))
+
+    return 1 if slower else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
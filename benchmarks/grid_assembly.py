@@ -0,0 +1,78 @@
+"""Benchmark of the assembly of replicated grid units, from 1x1 up to 12x12 units.
+
+Compares the old way of assembling a bin base (adding all units and the floor to one workplane and combining
+them) with the current one (fusing identical cells in glue mode), and times the assembly of the baseplate and
+the light bin floor. Run from the root of the repository:
+
+    python benchmarks/grid_assembly.py [max size]
+"""
+import os
+import sys
+import time
+
+# Measure the construction itself, not the shape cache
+os.environ['SHAPE_CACHE_ENTRIES'] = '0'
+
+sys.path.insert(0, os.getcwd())
+for generator in ("baseplate", "classicbin", "lightbin"):
+    sys.path.insert(0, os.path.join(os.getcwd(), "generators", generator))
+
+import cadquery as cq
+import grid_constants
+
+import baseplate_generator
+import baseplate_settings
+import classicbin_settings
+import lightbin_generator
+import lightbin_settings
+
+from generators.common import bin_base
+
+def timed(f):
+    start = time.perf_counter()
+    f()
+    return time.perf_counter() - start
+
+def combined_bin_base(settings, grid):
+    """The bin base as it was assembled before: all units and a single floor, combined in one go"""
+    plane = cq.Workplane("XY")
+    result = plane.workplane()
+    unit = bin_base.unit_base(plane, settings, grid)
+
+    for x in range(settings.sizeUnitsX):
+        for y in range(settings.sizeUnitsY):
+            result.add(unit.translate((x*grid.GRID_UNIT_SIZE_X_MM, y*grid.GRID_UNIT_SIZE_Y_MM, 0)))
+
+    brickSizeX = settings.sizeUnitsX * grid.GRID_UNIT_SIZE_X_MM - grid.BRICK_SIZE_TOLERANCE_MM
+    brickSizeY = settings.sizeUnitsY * grid.GRID_UNIT_SIZE_Y_MM - grid.BRICK_SIZE_TOLERANCE_MM
+    floor = (
+        result.faces(">Z").workplane()
+        .box(brickSizeX, brickSizeY, grid.FLOOR_THICKNESS, centered=False, combine=False)
+        .edges("|Z").fillet(grid.CORNER_FILLET_RADIUS)
+    )
+    result.add(floor)
+
+    return result.combine(clean=True)
+
+def main():
+    maxSize = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+
+    grid = grid_constants.Grid()
+    grid.MAX_GRID_UNITS = maxSize
+
+    print("{0:>6} {1:>6} {2:>18} {3:>16} {4:>10} {5:>15}".format("size", "units", "bin base combined", "bin base glued", "baseplate", "lightbin floor"))
+
+    for size in range(1, maxSize+1):
+        binSettings = classicbin_settings.Settings(sizeUnitsX=size, sizeUnitsY=size)
+        baseplate = baseplate_generator.Generator(baseplate_settings.Settings(sizeUnitsX=size, sizeUnitsY=size), grid)
+        lightbin = lightbin_generator.Generator(lightbin_settings.Settings(sizeUnitsX=size, sizeUnitsY=size), grid)
+
+        combined = timed(lambda: combined_bin_base(binSettings, grid))
+        glued = timed(lambda: bin_base.bin_base(cq.Workplane("XY"), binSettings, grid))
+        plate = timed(baseplate.base_grid)
+        floor = timed(lambda: lightbin.brick_floor(cq.Workplane("XY").workplane(offset=4.75)))
+
+        print("{0:>6} {1:>6} {2:>17.2f}s {3:>15.2f}s {4:>9.2f}s {5:>14.2f}s".format("{0}x{0}".format(size), size*size, combined, glued, plate, floor), flush=True)
+
+if __name__ == "__main__":
+    main()
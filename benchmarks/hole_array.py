@@ -0,0 +1,81 @@
+"""Benchmark of the hole grid of the holey bin, from 25 up to 2025 holes in a 10x10 bin.
+
+Compares the old way of making the holes (a tool for every hole, cut from the bin) with the current one (the top
+of the wall extruded from its outline with the holes in it), and times generating and exporting the whole model.
+Run from the root of the repository:
+
+    python benchmarks/hole_array.py [max holes per side] [shape]
+
+The shape is CIRCLE, SQUARE or HEXAGON (the default).
+"""
+import os
+import sys
+import time
+
+# Measure the construction itself, not the shape cache
+os.environ['SHAPE_CACHE_ENTRIES'] = '0'
+
+sys.path.insert(0, os.getcwd())
+sys.path.insert(0, os.path.join(os.getcwd(), "generators", "holeybin"))
+
+import cadquery as cq
+import grid_constants
+
+import holeybin_generator
+import holeybin_settings
+
+from generators.common.bin_base import bin_base
+from generators.common.model_export import export_to_bytes
+
+# The bin is 10x10 units for every number of holes, so only the holes change
+BIN_SIZE_MM = 400
+
+def timed(f):
+    start = time.perf_counter()
+    result = f()
+    return result, time.perf_counter() - start
+
+def cut_holes(gen, basePlane):
+    """The hole grid as it was made before: a tool for every hole, all cut from the base and the wall"""
+    s = gen.settings
+    x_step = gen.internalSizeX / s.numHolesX
+    y_step = gen.internalSizeY / s.numHolesY
+    offset_x = (gen.brickSizeX - gen.internalSizeX) / 2 + x_step / 2
+    offset_y = (gen.brickSizeY - gen.internalSizeY) / 2 + y_step / 2
+
+    points = [(x*x_step + offset_x, y*y_step + offset_y) for x in range(s.numHolesX) for y in range(s.numHolesY)]
+
+    if s.holeShape == "HEXAGON":
+        return basePlane.pushPoints(points).polygon(6, s.holeSize).extrude(-s.holeDepth, combine="cut")
+    elif s.holeShape == "SQUARE":
+        return basePlane.pushPoints(points).rect(s.holeSize, s.holeSize).extrude(-s.holeDepth, combine="cut")
+    return basePlane.pushPoints(points).hole(s.holeSize, s.holeDepth)
+
+def main():
+    maxHoles = int(sys.argv[1]) if len(sys.argv) > 1 else 45
+    shape = sys.argv[2].upper() if len(sys.argv) > 2 else "HEXAGON"
+
+    print("{0:>6} {1:>10} {2:>11} {3:>9} {4:>9} {5:>10}".format("holes", "cut holes", "hole array", "generate", "export", "triangles"))
+
+    for n in (5, 10, 15, 20, 30, 40, 45):
+        if n > maxHoles:
+            break
+
+        keepout = BIN_SIZE_MM / n
+        settings = holeybin_settings.Settings(numHolesX=n, numHolesY=n, keepoutDiameter=keepout, holeSize=0.6*keepout, holeShape=shape)
+        gen = holeybin_generator.Generator(settings, grid_constants.Grid())
+
+        base = bin_base(cq.Workplane("XY"), gen.settings, gen.grid)
+        wall = gen.outer_wall(base.faces(">Z").workplane())
+        plane = cq.Workplane("XY").add([base.val(), wall.val()]).faces(">Z").workplane()
+
+        _, cut = timed(lambda: cut_holes(gen, plane))
+        _, array = timed(lambda: gen.holey_grid(plane, base.val(), wall.val()))
+        model, generate = timed(gen.generate_model)
+        data, export = timed(lambda: export_to_bytes(model, "stl"))
+
+        # A binary STL file has an 84 byte header followed by 50 bytes per triangle
+        print("{0:>6} {1:>9.2f}s {2:>10.2f}s {3:>8.2f}s {4:>8.2f}s {5:>10}".format(n*n, cut, array, generate, export, (len(data) - 84) // 50), flush=True)
+
+if __name__ == "__main__":
+    main()
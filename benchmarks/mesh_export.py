@@ -0,0 +1,119 @@
+"""Benchmark of the mesh exporters against those of CadQuery.
+
+Generates a 6x6 baseplate and a 6x6x12 bin with dividers, and exports each of them to STL and 3MF with the exporters
+of CadQuery and with our own, at the normal quality. Reports the time of each export (the fastest of a few runs,
+tessellation included) and the size of the file. It also compares the two ways of getting the triangles of a
+tessellated shape into arrays: reading them node by node from Python, and reading the output of the STL writer of
+OpenCascade in one go, which is what the 3MF and preview exporters do. Run from the root of the repository:
+
+    python benchmarks/mesh_export.py
+    python benchmarks/mesh_export.py --repeat 5
+"""
+import argparse
+import importlib
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.getcwd())
+
+import numpy as np
+
+from cadquery import exporters
+from OCP.BRep import BRep_Tool
+from OCP.BRepTools import BRepTools
+from OCP.TopAbs import TopAbs_REVERSED
+from OCP.TopLoc import TopLoc_Location
+
+import grid_constants
+from generators.common.model_export import QUALITY_PRESETS, export_to_bytes, mesh_arrays, tessellate
+
+CASES = [
+    ("baseplate-6x6", "baseplate", {"sizeUnitsX": 6, "sizeUnitsY": 6}),
+    ("dividerbin-6x6x12", "classicbin", {"sizeUnitsX": 6, "sizeUnitsY": 6, "sizeUnitsZ": 12, "compartmentsX": 3, "compartmentsY": 3}),
+]
+
+def generate(generator, settings):
+    sys.path.insert(0, os.path.join(os.getcwd(), "generators", generator))
+
+    generatorModule = importlib.import_module(generator + "_generator")
+    settingsModule = importlib.import_module(generator + "_settings")
+
+    return generatorModule.Generator(settingsModule.Settings(**settings), grid_constants.Grid()).generate_model()
+
+def best_time(f, repeat):
+    """Run f the given number of times and return the shortest time and the last result"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = f()
+        times.append(time.perf_counter() - start)
+
+    return min(times), result
+
+def export_cadquery(model, export_format):
+    """Export with the exporter of CadQuery, at the same tolerances as our normal quality"""
+    tolerance, angularTolerance = QUALITY_PRESETS["normal"]
+
+    # Start from an untessellated shape, as our exporter does
+    for shape in model.vals():
+        BRepTools.Clean_s(shape.wrapped)
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "model." + export_format)
+        exporters.export(model, filename, export_format.upper(), tolerance=tolerance, angularTolerance=angularTolerance)
+
+        with open(filename, 'rb') as reader:
+            return reader.read()
+
+def arrays_by_node(shape):
+    """Read the triangles of a tessellated shape into arrays node by node, for comparison with mesh_arrays()"""
+    corners = []
+    for face in shape.Faces():
+        location = TopLoc_Location()
+        triangulation = BRep_Tool.Triangulation_s(face.wrapped, location)
+        if not triangulation:
+            continue
+
+        transform = location.Transformation()
+        nodes = np.array([triangulation.Node(i).Transformed(transform).Coord() for i in range(1, triangulation.NbNodes() + 1)])
+        triangles = np.array([triangulation.Triangle(i).Get() for i in range(1, triangulation.NbTriangles() + 1)]) - 1
+        if face.wrapped.Orientation() == TopAbs_REVERSED:
+            triangles = triangles[:, [0, 2, 1]]
+
+        corners.append(nodes[triangles])
+
+    return np.concatenate(corners).astype(np.float32)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the mesh exporters")
+    parser.add_argument("--repeat", type=int, default=3, help="run each export this many times and keep the fastest")
+    args = parser.parse_args()
+
+    print("{0:<20} {1:<30} {2:>9} {3:>12}".format("case", "export", "time", "size"))
+
+    for name, generator, settings in CASES:
+        model = generate(generator, settings)
+
+        for export_format in ("stl", "3mf"):
+            seconds, data = best_time(lambda: export_cadquery(model, export_format), args.repeat)
+            print("{0:<20} {1:<30} {2:>8.3f}s {3:>10.0f}kB".format(name, export_format + " (CadQuery)", seconds, len(data) / 1024))
+
+            seconds, data = best_time(lambda: export_to_bytes(model, export_format, "normal"), args.repeat)
+            print("{0:<20} {1:<30} {2:>8.3f}s {3:>10.0f}kB".format(name, export_format, seconds, len(data) / 1024))
+
+        seconds, data = best_time(lambda: export_to_bytes(model, "glb"), args.repeat)
+        print("{0:<20} {1:<30} {2:>8.3f}s {3:>10.0f}kB".format(name, "glb (preview)", seconds, len(data) / 1024))
+
+        shape = tessellate(model, "normal")
+        seconds, corners = best_time(lambda: arrays_by_node(shape), args.repeat)
+        print("{0:<20} {1:<30} {2:>8.3f}s {3:>10} triangles".format(name, "arrays, node by node", seconds, len(corners)))
+
+        seconds, corners = best_time(lambda: mesh_arrays(shape), args.repeat)
+        print("{0:<20} {1:<30} {2:>8.3f}s {3:>10} triangles".format(name, "arrays, from the STL writer", seconds, len(corners)), flush=True)
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
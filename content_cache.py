@@ -0,0 +1,27 @@
+import os
+import threading
+
+# Check whether files changed on every read, so edits show up without a restart. Enabled in debug mode
+check_modified = False
+
+# The contents of the files read so far, as (modification time, text) by path
+contents = {}
+lock = threading.Lock()
+
+def read(path):
+    """Return the contents of a text file. The file is only read the first time, or when it changed if check_modified is set"""
+    modified = os.path.getmtime(path) if check_modified else None
+
+    with lock:
+        entry = contents.get(path)
+
+    if entry and (not check_modified or entry[0] == modified):
+        return entry[1]
+
+    with open(path, 'r') as reader:
+        text = reader.read()
+
+    with lock:
+        contents[path] = (modified, text)
+
+    return text
@@ -0,0 +1,31 @@
+import gzip
+
+try:
+    import zstandard
+except ImportError:
+    # zstd is optional, without it models are only compressed with gzip
+    zstandard = None
+
+# Encodings offered to clients, the preferred one first
+ENCODINGS = ("zstd", "gzip") if zstandard else ("gzip",)
+
+# Formats that are worth compressing. A 3MF file is a ZIP archive, so it is compressed already
+COMPRESSIBLE_FORMATS = ("stl", "step", "glb")
+
+# Compressed models are cached, but compressing still delays the first download, so don't use the slowest levels
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 10
+
+def negotiate(request, export_format):
+    """Return the encoding to send a model in, or None to send it uncompressed"""
+    if export_format not in COMPRESSIBLE_FORMATS:
+        return None
+
+    return request.accept_encodings.best_match(ENCODINGS)
+
+def compress(data, encoding):
+    """Compress data with the encoding. The same data always results in the same output"""
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
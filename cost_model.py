@@ -0,0 +1,96 @@
+import functools
+import json
+import logging
+import os
+
+from dataclasses import dataclass
+
+logger = logging.getLogger('COST')
+
+# The coefficients of the model, fitted to the benchmark results by benchmarks/fit_cost_model.py
+COEFFICIENTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cost_model.json")
+
+# Models that are predicted to take longer or need more memory than this are refused. The hard limits of the
+# settings in grid_constants.Grid still apply as well
+MAX_SECONDS = float(os.environ.get('GENERATOR_MAX_PREDICTED_SECONDS', 30))
+MAX_MEMORY_MB = float(os.environ.get('GENERATOR_MAX_PREDICTED_MB', 1536))
+
+class CostLimitError(Exception):
+    """Raised for a model that is predicted to be too expensive to generate"""
+
+@dataclass
+class Estimate:
+    """The predicted cost of a model: the time to generate it and export it as STL, and the peak memory use (RSS)
+       of a fresh worker process generating it
+    """
+    seconds: float
+    memory_mb: float
+
+def cells(s):
+    return s.sizeUnitsX * s.sizeUnitsY
+
+def compartments(s):
+    return s.compartmentsX * s.compartmentsY
+
+def dividers(s):
+    # The total length of the divider walls, in grid units
+    return (s.compartmentsX - 1) * s.sizeUnitsY + (s.compartmentsY - 1) * s.sizeUnitsX
+
+def holes(s):
+    return s.numHolesX * s.numHolesY
+
+# The cost of a model is a linear function of these features of its settings, which count the parts each generator
+# builds and combines
+FEATURES = {
+    "baseplate": {"cells": cells},
+    "classicbin": {"cells": cells, "dividers": dividers, "compartments": compartments},
+    "holeybin": {"cells": cells, "holes": holes},
+    "lightbin": {"cells": cells, "dividers": dividers, "compartments": compartments},
+    "solidbin": {"cells": cells},
+}
+
+def features(generator_id, settings):
+    """Return the values of the features of a generator for the (validated) settings"""
+    return [feature(settings) for feature in FEATURES[generator_id].values()]
+
+@functools.lru_cache(maxsize=1)
+def coefficients():
+    """Return the fitted model of each generator: the intercept and the coefficient of each feature,
+       for the time and for the memory use
+    """
+    try:
+        with open(COEFFICIENTS_FILE, 'r') as reader:
+            return json.load(reader)
+    except OSError:
+        logger.warning("No cost model found, models are not checked for their cost")
+        return {}
+
+def predict(values, weights):
+    return weights[0] + sum(value * weight for value, weight in zip(values, weights[1:]))
+
+def estimate(generator_id, settings):
+    """Predict the cost of the model of a generator with the (validated) settings. Returns None for a generator
+       without a fitted model
+    """
+    model = coefficients().get(generator_id)
+    if model is None or generator_id not in FEATURES:
+        return None
+
+    values = features(generator_id, settings)
+    return Estimate(predict(values, model["seconds"]), predict(values, model["memory_mb"]))
+
+def check(job):
+    """Raise CostLimitError if the model of the job is predicted to take too long or to need too much memory.
+       Returns the estimate, or None if the cost of the model can't be predicted
+    """
+    cost = estimate(job.generator_id, job.generator.settings)
+    if cost is None:
+        return None
+
+    if MAX_SECONDS and cost.seconds > MAX_SECONDS:
+        raise CostLimitError("This model is too complex to generate: it would take about {0:.0f} seconds, while the server allows {1:.0f}".format(cost.seconds, MAX_SECONDS))
+
+    if MAX_MEMORY_MB and cost.memory_mb > MAX_MEMORY_MB:
+        raise CostLimitError("This model is too complex to generate: it would need about {0:.0f} MB of memory, while the server allows {1:.0f} MB".format(cost.memory_mb, MAX_MEMORY_MB))
+
+    return cost
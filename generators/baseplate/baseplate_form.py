@@ -3,25 +3,28 @@ from wtforms import IntegerField, SelectField, BooleanField
 from wtforms.widgets import NumberInput
 from grid_constants import *
 import os
-import help_provider as help
+import content_cache
 from generators.common.settings_form import get_standard_settings_form
+from generators.common.model_export import DEFAULT_QUALITY, QUALITY_CHOICES
 
 class Form(FlaskForm):
     id = "baseplate"
     sizeUnitsX     = IntegerField("Width", widget=NumberInput(min = 1, max = Grid.MAX_GRID_UNITS), default=2)
     sizeUnitsY     = IntegerField("Length", widget=NumberInput(min = 1, max = Grid.MAX_GRID_UNITS), default=2)
-    exportFormat   = SelectField('Export format', choices=[('stl', 'STL'), ('step', 'STEP')])
+    exportFormat   = SelectField('Export format', choices=[('stl', 'STL'), ('3mf', '3MF'), ('step', 'STEP')])
+    quality        = SelectField('STL quality', choices=QUALITY_CHOICES, default=DEFAULT_QUALITY)
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.sizeUnitsX.description = help.get_size_help()
-        self.sizeUnitsY.description = help.get_size_help()
-        self.exportFormat.description = help.get_exportformat_help()
+        self.sizeUnitsX.description = "size"
+        self.sizeUnitsY.description = "size"
+        self.exportFormat.description = "export_format"
+        self.quality.description = "quality"
 
     def get_rows(self):
         return [
             ["Size", [self.sizeUnitsX, self.sizeUnitsY]],
-            ["Options", [self.exportFormat]],
+            ["Options", [self.exportFormat, self.quality]],
         ]
     
     def get_settings_html(self):
@@ -31,5 +34,4 @@ class Form(FlaskForm):
         return "Baseplate"
     
     def get_description(self):
-        with open(os.path.dirname(__file__) + '/baseplate_description.html', 'r') as reader:
-            return reader.read()       
+        return content_cache.read(os.path.dirname(__file__) + '/baseplate_description.html')       
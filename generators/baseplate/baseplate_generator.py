@@ -1,7 +1,9 @@
 import cadquery as cq
-from cadquery import exporters
 from grid_constants import *
 
+from generators.common.assembly import fuse_touching
+from generators.common.stage_timing import span, timed_stage
+
 class Generator:
     def __init__(self, settings, grid) -> None:
         self.settings = settings
@@ -9,6 +11,7 @@ class Generator:
 
         self.validate_settings()
 
+    @timed_stage
     def base_grid(self):
         """Create the baseplate"""
         x_offs = -self.grid.GRID_UNIT_SIZE_X_MM/2
@@ -37,13 +40,14 @@ class Generator:
             .sweep(path)
             )
 
-        result = cq.Workplane("XY")
+        units = []
 
         for x in range(self.settings.sizeUnitsX):
             for y in range(self.settings.sizeUnitsY):
-                result.add(unit.translate((x*self.grid.GRID_UNIT_SIZE_X_MM, y*self.grid.GRID_UNIT_SIZE_Y_MM, 0)))
+                units.append(unit.val().translate((x*self.grid.GRID_UNIT_SIZE_X_MM, y*self.grid.GRID_UNIT_SIZE_Y_MM, 0)))
 
-        result = result.combine(clean=True)
+        # Neighbouring units share a side, so they can be fused in a single fast pass
+        result = cq.Workplane("XY").newObject([fuse_touching(units)])
         result = result.edges("|Z").fillet(3.999)
 
         return result
@@ -63,11 +67,7 @@ class Generator:
         result.add(self.base_grid())
 
         # Combine everything together
-        result = result.combine(clean=True)
+        with span("combine"):
+            result = result.combine(clean=True)
 
         return result
-
-    def generate_stl(self, filename):
-        model = self.generate_model()
-        exporters.export(model, filename)
-
@@ -4,8 +4,9 @@ from wtforms.widgets import NumberInput
 from grid_constants import *
 
 import os
-import help_provider as help
+import content_cache
 from generators.common.settings_form import get_standard_settings_form
+from generators.common.model_export import DEFAULT_QUALITY, QUALITY_CHOICES
 
 class Form(FlaskForm):
     id = "classicbin"
@@ -22,31 +23,33 @@ class Form(FlaskForm):
     addGrabCurve    = BooleanField("Scoop ramp", default="true", false_values=(False, "false", ""))
     addLabelRidge   = BooleanField("Add label tab(s)", default="true", false_values=(False, "false", ""))
     multiLabel      = BooleanField("Label tab per row", false_values=(False, "false", ""))
-    exportFormat    = SelectField('Export format', choices=[('stl', 'STL'), ('step', 'STEP')])
+    exportFormat    = SelectField('Export format', choices=[('stl', 'STL'), ('3mf', '3MF'), ('step', 'STEP')])
+    quality         = SelectField('STL quality', choices=QUALITY_CHOICES, default=DEFAULT_QUALITY)
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.sizeUnitsX.description = help.get_size_help()
-        self.sizeUnitsY.description = help.get_size_help()
-        self.sizeUnitsZ.description = help.get_size_help()
-        self.compartmentsX.description = help.get_compartment_help()
-        self.compartmentsY.description = help.get_compartment_help()
-        self.addStackingLip.description = help.get_stackinglip_help()
-        self.addMagnetHoles.description = help.get_magnet_help()
-        self.magnetHoleDiameter.description = help.get_magnet_help()
-        self.addRemovalHoles.description = help.get_magnet_help()
-        self.addScrewHoles.description = help.get_magnet_help()
-        self.addGrabCurve.description = help.get_scoopramp_help()
-        self.addLabelRidge.description = help.get_labeltab_help()
-        self.multiLabel.description = help.get_labeltab_help()
-        self.exportFormat.description = help.get_exportformat_help()
+        self.sizeUnitsX.description = "size"
+        self.sizeUnitsY.description = "size"
+        self.sizeUnitsZ.description = "size"
+        self.compartmentsX.description = "compartment"
+        self.compartmentsY.description = "compartment"
+        self.addStackingLip.description = "stackinglip"
+        self.addMagnetHoles.description = "magnet"
+        self.magnetHoleDiameter.description = "magnet"
+        self.addRemovalHoles.description = "magnet"
+        self.addScrewHoles.description = "magnet"
+        self.addGrabCurve.description = "scoopramp"
+        self.addLabelRidge.description = "labeltab"
+        self.multiLabel.description = "labeltab"
+        self.exportFormat.description = "export_format"
+        self.quality.description = "quality"
 
     def get_rows(self):
         return [
           ["Size", [self.sizeUnitsX, self.sizeUnitsY, self.sizeUnitsZ]],
           ["Compartments", [self.compartmentsX, self.compartmentsY]],
           ["Magnets", [self.addMagnetHoles, self.addRemovalHoles, self.addScrewHoles, self.magnetHoleDiameter]],
-          ["Other", [self.addStackingLip, self.addGrabCurve, self.exportFormat]],
+          ["Other", [self.addStackingLip, self.addGrabCurve, self.exportFormat, self.quality]],
           ["Labels", [self.addLabelRidge, self.multiLabel]],
         ]
 
@@ -57,5 +60,4 @@ class Form(FlaskForm):
         return get_standard_settings_form()
     
     def get_description(self):
-        with open(os.path.dirname(__file__) + '/classicbin_description.html', 'r') as reader:
-            return reader.read()    
\ No newline at end of file
+        return content_cache.read(os.path.dirname(__file__) + '/classicbin_description.html')    
\ No newline at end of file
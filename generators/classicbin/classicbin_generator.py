@@ -1,13 +1,25 @@
 import cadquery as cq
-from cadquery import exporters
 from dataclasses import dataclass
 from grid_constants import *
 import logging
 
 from generators.common.bin_base import bin_base
+from generators.common.shape_cache import cached_stage, grid_key
+from generators.common.stage_timing import span, timed_stage
 
 logger = logging.getLogger('CBG')
 
+def rectangle(x0, y0, x1, y1):
+    """Return a rectangular face in the XY plane"""
+    return cq.Face.makeFromWires(cq.Wire.makePolygon([(x0, y0, 0), (x1, y0, 0), (x1, y1, 0), (x0, y1, 0)], close=True))
+
+def repeat(shape, count, stepY):
+    """Return count copies of the shape, each the next one stepY further in the Y direction. Translating a
+       copy is much cheaper than building it again. Copies that share their geometry would be cheaper still,
+       but slow down combining them with the rest of the bin
+    """
+    return [shape.translate(cq.Vector(0, i*stepY, 0)) for i in range(count)]
+
 class Generator:
     def __init__(self, settings, grid) -> None:
         self.settings = settings
@@ -29,17 +41,62 @@ class Generator:
         self.compartmentSizeY = self.internalSizeY / self.settings.compartmentsY
         self.compartmentSizeZ = (self.settings.sizeUnitsZ-1)*self.grid.HEIGHT_UNITSIZE_MM
 
-    def outer_wall(self, basePlane):
-        """Create the outer wall of the bin"""
+    @timed_stage
+    def walls(self, basePlane):
+        """Create the outer wall and the divider walls, up to the stacking lip"""
+        key = (self.brickSizeX, self.brickSizeY, self.compartmentSizeZ, self.settings.compartmentsX, self.settings.compartmentsY,
+               self.settings.dividerThickness, grid_key(self.grid))
+        return cached_stage("classicbin.walls", basePlane, key, lambda: self.build_walls(basePlane))
 
-        sizeZ = self.compartmentSizeZ
+    def build_walls(self, basePlane):
+        # All walls are laid out as a single face: the outline of the bin with a pocket for every compartment.
+        # Extruding it makes the walls in one go, without combining a box for every divider
+        thickness = self.grid.WALL_THICKNESS
+        halfDivider = self.settings.dividerThickness / 2
 
-        if self.settings.addStackingLip:
-            sizeZ = sizeZ + self.grid.STACKING_LIP_HEIGHT
+        outline = rectangle(0, 0, self.brickSizeX, self.brickSizeY)
+        outline = outline.fillet2D(self.grid.CORNER_FILLET_RADIUS, outline.Vertices())
 
-        wall = basePlane.box(self.brickSizeX, self.brickSizeY, sizeZ, centered=False, combine = False)
-        
+        # The inside of the outer wall. If the walls are thicker than the outside radius of the corners, skip the fillet
+        inside = rectangle(thickness, thickness, thickness + self.internalSizeX, thickness + self.internalSizeY)
+        rounded = thickness < self.grid.CORNER_FILLET_RADIUS
+        if rounded:
+            inside = inside.fillet2D(self.grid.CORNER_FILLET_RADIUS-thickness, inside.Vertices())
+
+        pockets = []
+        for x in range(self.settings.compartmentsX):
+            for y in range(self.settings.compartmentsY):
+                x0 = thickness + x*self.compartmentSizeX + (halfDivider if x > 0 else 0)
+                x1 = thickness + (x+1)*self.compartmentSizeX - (halfDivider if x < self.settings.compartmentsX-1 else 0)
+                y0 = thickness + y*self.compartmentSizeY + (halfDivider if y > 0 else 0)
+                y1 = thickness + (y+1)*self.compartmentSizeY - (halfDivider if y < self.settings.compartmentsY-1 else 0)
+
+                # Dividers that are thicker than the compartments fill them completely
+                if x1 <= x0 or y1 <= y0:
+                    continue
+
+                pocket = rectangle(x0, y0, x1, y1)
+
+                # The compartments in the corners follow the rounded inside of the outer wall
+                if rounded and x in (0, self.settings.compartmentsX-1) and y in (0, self.settings.compartmentsY-1):
+                    pocket = pocket.intersect(inside).Faces()[0]
+
+                pockets.append(pocket.outerWire())
+
+        result = cq.Solid.extrudeLinear(outline.outerWire(), pockets, cq.Vector(0, 0, self.compartmentSizeZ))
+        return basePlane.newObject([result.moved(basePlane.plane.location)])
+
+    @timed_stage
+    def stacking_lip(self, basePlane):
+        """Create the stacking lip on top of the walls"""
+        key = (self.brickSizeX, self.brickSizeY, self.compartmentSizeZ, grid_key(self.grid))
+        return cached_stage("classicbin.stacking_lip", basePlane, key, lambda: self.build_stacking_lip(basePlane))
+
+    def build_stacking_lip(self, basePlane):
         thickness = self.grid.WALL_THICKNESS
+        sizeZ = self.grid.STACKING_LIP_HEIGHT
+
+        wall = basePlane.box(self.brickSizeX, self.brickSizeY, sizeZ, centered=False, combine = False)
         wall = wall.edges("|Z").fillet(self.grid.CORNER_FILLET_RADIUS)
 
         cutout = (
@@ -50,49 +107,25 @@ class Generator:
         # If the walls are thicker than the outside radius of the corners, skip the fillet
         if thickness < self.grid.CORNER_FILLET_RADIUS:
             cutout = cutout.edges("|Z").fillet(self.grid.CORNER_FILLET_RADIUS-thickness)
-        
+
         result = wall-cutout
-        
-        if self.settings.addStackingLip:
-            result = result.edges(
-                        cq.selectors.NearestToPointSelector((self.brickSizeX/2, self.brickSizeY/2, sizeZ*2))
-                    ).chamfer(thickness-self.grid.CHAMFER_EPSILON)
-            
-        return result
 
-    def divider_walls(self, basePlane):
-        """Create a regularly spaced grid of internal divider walls"""
-        
-        resultPlane = basePlane.center(self.grid.WALL_THICKNESS, self.grid.WALL_THICKNESS)
-        result = resultPlane.workplane()
-        
-        if(self.settings.compartmentsX > 1):
-            for x in range(self.settings.compartmentsX-1):
-                result.add(resultPlane.box(self.settings.dividerThickness,self.internalSizeY, self.compartmentSizeZ,
-                        centered=(True, False,False), combine=False).translate(((x+1)*self.compartmentSizeX, 0, 0)))
-
-        if(self.settings.compartmentsY > 1):
-            for y in range(self.settings.compartmentsY-1):
-                result.add(resultPlane.box(self.internalSizeX,self.settings.dividerThickness,self.compartmentSizeZ, 
-                        centered=(False, True, False), combine=False).translate((0, (y+1)*self.compartmentSizeY, 0)))
-
-        # Combining fails when there is no overlap between the objects, which is the case when there are 0 dividers in one direction
-        if(self.settings.compartmentsX > 1 and self.settings.compartmentsY > 1):
-            result = result.combine()
-
-        return result
+        return result.edges(
+                    cq.selectors.NearestToPointSelector((self.brickSizeX/2, self.brickSizeY/2, (self.compartmentSizeZ+sizeZ)*2))
+                ).chamfer(thickness-self.grid.CHAMFER_EPSILON)
 
+    @timed_stage
     def label_tab(self, basePlane):
-        """Construct the pickup/label tab"""
-
-        result = basePlane.workplane()
-
+        """Construct the pickup/label tab, or one for every row of compartments"""
         numRidges = self.settings.compartmentsY if self.settings.multiLabel else 1
         labelRidgeHeight = min(self.compartmentSizeZ, self.settings.labelRidgeWidth-self.grid.CHAMFER_EPSILON)
 
-        for x in range(numRidges):
-            startX = self.grid.WALL_THICKNESS + x*self.compartmentSizeY
-            result.add(
+        key = (self.settings.labelRidgeWidth, labelRidgeHeight, self.brickSizeZ, self.internalSizeX, self.compartmentSizeY, numRidges, grid_key(self.grid))
+        return cached_stage("classicbin.label_tab", basePlane, key, lambda: self.build_label_tab(basePlane, numRidges, labelRidgeHeight))
+
+    def build_label_tab(self, basePlane, numRidges, labelRidgeHeight):
+        startX = self.grid.WALL_THICKNESS
+        tab = (
                 basePlane.sketch()
                 .segment((startX,self.brickSizeZ-labelRidgeHeight),(startX,self.brickSizeZ))
                 .segment((startX+self.settings.labelRidgeWidth,self.brickSizeZ))
@@ -103,20 +136,23 @@ class Generator:
                 .finalize()
                 .extrude(self.internalSizeX)
                 .edges(">Y").fillet(0.5)
-                )
-            
-        return result
-
-    def grab_curve(self, basePlane):
+              ).val()
 
-        result = basePlane.workplane()
+        # The tabs of all rows are the same, so one is built and moved to each row
+        return basePlane.newObject(repeat(tab, numRidges, self.compartmentSizeY))
 
+    @timed_stage
+    def grab_curve(self, basePlane):
+        """Construct the curved floor at the front of every row of compartments"""
         # To ensure the curve fits, take the smallest of: The height of the divider walls, the length of a compartment, half the brick unit-size (Y-direction)
         radius = min((self.settings.sizeUnitsZ-1) * self.grid.HEIGHT_UNITSIZE_MM, self.compartmentSizeY, self.grid.BRICK_UNIT_SIZE_Y/2)
-        
-        for y in range(self.settings.compartmentsY):
-            startX = self.grid.WALL_THICKNESS + (y+1)*self.compartmentSizeY
-            result.add(
+
+        key = (radius, self.internalSizeX, self.compartmentSizeY, self.settings.compartmentsY, grid_key(self.grid))
+        return cached_stage("classicbin.grab_curve", basePlane, key, lambda: self.build_grab_curve(basePlane, radius))
+
+    def build_grab_curve(self, basePlane, radius):
+        startX = self.grid.WALL_THICKNESS + self.compartmentSizeY
+        curve = (
                 basePlane.sketch()
                 .segment((startX,self.grid.HEIGHT_UNITSIZE_MM+radius),(startX,self.grid.HEIGHT_UNITSIZE_MM))
                 .segment((startX-radius,self.grid.HEIGHT_UNITSIZE_MM))
@@ -124,9 +160,10 @@ class Generator:
                 .assemble()
                 .finalize()
                 .extrude(self.internalSizeX)
-                )
+                ).val()
 
-        return result
+        # The curves of all rows are the same, so one is built and moved to each row
+        return basePlane.newObject(repeat(curve, self.settings.compartmentsY, self.compartmentSizeY))
 
     def validate_settings(self):
         """Do some sanity checking on the settings to prevent impossible or unreasonable results"""
@@ -156,11 +193,12 @@ class Generator:
         # Continue at the top of the base
         plane = result.faces(">Z").workplane()
 
-        # Add the outer walls
-        result.add(self.outer_wall(plane))
-        
-        # Add the divider walls
-        result.add(self.divider_walls(plane))
+        # Add the outer wall and the divider walls
+        result.add(self.walls(plane))
+
+        # Add the stacking lip on top of the walls
+        if self.settings.addStackingLip:
+            result.add(self.stacking_lip(plane.workplane(offset=self.compartmentSizeZ)))
 
         # Continue from the left-most outside face of the brick
         plane = cq.Workplane("YZ").workplane(offset=self.grid.WALL_THICKNESS)
@@ -174,13 +212,7 @@ class Generator:
             result.add(self.grab_curve(plane))
 
         # Combine everything together
-        result = result.combine(clean=True)
+        with span("combine"):
+            result = result.combine(clean=True)
 
         return result
-
-    def generate_stl(self, filename):
-        model = self.generate_model()
-        logger.debug("Saved classicbin to {0}".format(filename))
-        exporters.export(model, filename)
-
-
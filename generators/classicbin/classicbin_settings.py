@@ -20,5 +20,5 @@ class Settings:
     multiLabel:     bool = False  # Add a ridge to every row of compartments?
 
     exportFormat: str = "stl"
-    labelRidgeWidth:  int = 13   
-    dividerThickness: int = 1.5
\ No newline at end of file
+    labelRidgeWidth:  float = 13.0
+    dividerThickness: float = 1.5
\ No newline at end of file
@@ -0,0 +1,14 @@
+def fuse_touching(shapes, clean=True):
+    """Fuse a list of shapes that touch, but don't overlap, into a single shape. This uses the glue mode of the
+       fuse, which skips intersecting the interiors of the shapes. For e.g. a grid of units this is much faster
+       than combining them in the normal way, and the difference grows with the number of units
+    """
+    result = shapes[0]
+
+    if len(shapes) > 1:
+        result = result.fuse(*shapes[1:], glue=True)
+
+    if clean:
+        result = result.clean()
+
+    return result
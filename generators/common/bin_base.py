@@ -1,10 +1,22 @@
 import cadquery as cq
 
 from grid_constants import *
+from generators.common.assembly import fuse_touching
+from generators.common.shape_cache import cached_stage, grid_key
+from generators.common.stage_timing import timed_stage
+
+def hole_key(settings, grid):
+    """Key of the settings that determine the shape of a single unit base"""
+    return (settings.addMagnetHoles, settings.magnetHoleDiameter, settings.addRemovalHoles, settings.addScrewHoles, grid_key(grid))
+
+def size_key(settings):
+    return (settings.sizeUnitsX, settings.sizeUnitsY)
 
 def unit_base(basePlane, settings, grid):
     """Construct a 1x1 GridFinity unit base on the provided workplane"""
-    
+    return cached_stage("unit_base", basePlane, hole_key(settings, grid), lambda: build_unit_base(basePlane, settings, grid))
+
+def build_unit_base(basePlane, settings, grid):
     # The elements are constructed "centered" because that makes life easier. 
     baseBottom = basePlane.box(grid.BASE_BOTTOM_SIZE_X, grid.BASE_BOTTOM_SIZE_Y, grid.BASE_BOTTOM_THICKNESS, combine=False)
     baseBottom = baseBottom.edges("|Z").fillet(grid.BASE_BOTTOM_FILLET_RADIUS)
@@ -45,41 +57,65 @@ def unit_base(basePlane, settings, grid):
             
     return result
 
-def grid_base(basePlane, settings, grid):
-    """Construct a base of WidthxLength grid units"""
-    
-    result = basePlane.workplane()
-    
-    base_unit = unit_base(basePlane, settings, grid)
-    
-    for x in range(settings.sizeUnitsX):
-        for y in range(settings.sizeUnitsY):
-            result.add(base_unit.translate((x*grid.GRID_UNIT_SIZE_X_MM, y*grid.GRID_UNIT_SIZE_Y_MM, 0)))
-    
-    return result
-
-def brick_floor(basePlane, settings, grid):
-    """Create a floor covering all unit bases"""
-
+def floor_tile(basePlane, settings, grid, x, y):
+    """Create the part of the floor on top of the unit base at grid position (x, y). The tiles of
+       neighbouring units touch, together they form the floor covering all unit bases
+    """
     brickSizeX = settings.sizeUnitsX * grid.GRID_UNIT_SIZE_X_MM - grid.BRICK_SIZE_TOLERANCE_MM 
     brickSizeY = settings.sizeUnitsY * grid.GRID_UNIT_SIZE_Y_MM - grid.BRICK_SIZE_TOLERANCE_MM
+    halfGap = grid.BRICK_SIZE_TOLERANCE_MM/2
 
-    floor = basePlane.box(brickSizeX, brickSizeY, grid.FLOOR_THICKNESS, centered = False, combine = False)
-    
-    floor = floor.edges("|Z").fillet(grid.CORNER_FILLET_RADIUS)
+    # Tiles on the outside stop at the edge of the brick, the others halfway between two units
+    firstX, lastX = x == 0, x == settings.sizeUnitsX-1
+    firstY, lastY = y == 0, y == settings.sizeUnitsY-1
+    startX = 0 if firstX else x*grid.GRID_UNIT_SIZE_X_MM - halfGap
+    endX = brickSizeX if lastX else (x+1)*grid.GRID_UNIT_SIZE_X_MM - halfGap
+    startY = 0 if firstY else y*grid.GRID_UNIT_SIZE_Y_MM - halfGap
+    endY = brickSizeY if lastY else (y+1)*grid.GRID_UNIT_SIZE_Y_MM - halfGap
+
+    # The floor starts at the top of the unit bases
+    floorZ = grid.BASE_BOTTOM_THICKNESS + grid.BASE_TOP_THICKNESS
 
-    return floor
+    tile = (
+        basePlane.workplane(offset=floorZ).center(startX, startY)
+        .box(endX-startX, endY-startY, grid.FLOOR_THICKNESS, centered = False, combine = False)
+    )
 
+    # Round the tiles that form a corner of the floor
+    for isCornerX, cornerX in ((firstX, startX), (lastX, endX)):
+        for isCornerY, cornerY in ((firstY, startY), (lastY, endY)):
+            if isCornerX and isCornerY:
+                tile = tile.edges(cq.selectors.NearestToPointSelector((cornerX, cornerY, floorZ))).fillet(grid.CORNER_FILLET_RADIUS)
+
+    return tile
+
+@timed_stage
 def bin_base(basePlane, settings, grid):
-    
-    result = grid_base(basePlane, settings, grid)
+    """Construct the complete base of a bin: the unit bases with a floor on top"""
+    key = size_key(settings) + hole_key(settings, grid)
+    return cached_stage("bin_base", basePlane, key, lambda: build_bin_base(basePlane, settings, grid))
+
+def build_bin_base(basePlane, settings, grid):
+    unit = unit_base(basePlane, settings, grid).val()
+
+    # The base consists of a cell for each grid unit: a unit base with its floor tile on top. Cells at the same kind
+    # of position (corner, edge or middle) are identical, so each kind is built only once and then translated
+    cells = {}
+    shapes = []
+
+    for x in range(settings.sizeUnitsX):
+        for y in range(settings.sizeUnitsY):
+            kind = (x == 0, x == settings.sizeUnitsX-1, y == 0, y == settings.sizeUnitsY-1)
 
-    # Continue from the top of the base
-    plane = result.faces(">Z").workplane()
+            if kind not in cells:
+                tile = floor_tile(basePlane, settings, grid, x, y).val()
+                cell = unit.translate((x*grid.GRID_UNIT_SIZE_X_MM, y*grid.GRID_UNIT_SIZE_Y_MM, 0)).fuse(tile)
+                cells[kind] = (cell, x, y)
 
-    # Add the floor of the bin
-    result.add(brick_floor(plane, settings, grid))
+            cell, cellX, cellY = cells[kind]
+            shapes.append(cell.translate(((x-cellX)*grid.GRID_UNIT_SIZE_X_MM, (y-cellY)*grid.GRID_UNIT_SIZE_Y_MM, 0)))
 
-    result = result.combine(clean=True)
+    # The cells only touch each other, so they can be fused in a single fast pass
+    result = fuse_touching(shapes)
 
-    return result
\ No newline at end of file
+    return basePlane.newObject([result])
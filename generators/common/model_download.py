@@ -0,0 +1,221 @@
+from flask import request, send_file
+from concurrent.futures import Future
+from dataclasses import dataclass
+
+import artifact_cache
+import content_encoding
+import cost_model
+import job_pool
+import metrics
+
+import io
+import logging
+import os
+
+from generators.common.model_export import DEFAULT_QUALITY, TESSELLATED_FORMATS, export_to_bytes
+from generators.common.stage_timing import collect_spans, span
+
+logger = logging.getLogger('GFG')
+
+# Generating a model is aborted when it takes longer than this many seconds (0 for no limit). The limit can be set
+# for each generator as well, e.g. GENERATOR_DEADLINE_SECONDS_BASEPLATE for the baseplate generator
+DEADLINE_SECONDS = float(os.environ.get('GENERATOR_DEADLINE_SECONDS', 120))
+
+# Models that are predicted to take at most this many seconds run in the fast lane of the worker pool, so they
+# don't wait behind large models. Models without a prediction run in the bulk lane
+FAST_LANE_SECONDS = float(os.environ.get('GENERATOR_FAST_LANE_SECONDS', 2))
+
+# How often a request that waits for a model checks whether its client is still connected, in seconds
+DISCONNECT_CHECK_SECONDS = 1
+
+@dataclass
+class ModelJob:
+    """Everything needed to generate a model and send it to the client"""
+    generator_id: str
+    generator: object
+    export_format: str
+    download_name: str
+    quality: str = DEFAULT_QUALITY
+
+    def cache_key(self):
+        # The quality only affects the tessellation of mesh files
+        quality = self.quality if self.export_format in TESSELLATED_FORMATS else None
+        return artifact_cache.cache_key(self.generator_id, self.generator.settings, self.generator.grid, self.export_format, quality)
+
+class ModelFuture(Future):
+    """Future of a model file, which is running as long as the job that generates it is running"""
+
+    def __init__(self, job_future):
+        super().__init__()
+        self.job_future = job_future
+
+    def running(self):
+        return self.job_future.running() and not self.done()
+
+    def abort(self):
+        """Stop generating the model, because nobody is waiting for it anymore"""
+        job_pool.abort(self.job_future)
+
+def get_deadline(generator_id):
+    """Return the number of seconds generating a model of the generator may take, 0 for no limit"""
+    return float(os.environ.get('GENERATOR_DEADLINE_SECONDS_' + generator_id.upper(), DEADLINE_SECONDS))
+
+def export_model(gen, export_format, quality=DEFAULT_QUALITY):
+    """Generate the model of the provided generator and return it as a file in the requested format,
+       together with the time spent in each stage. This is the part of a request that runs in a worker process
+    """
+    with collect_spans() as spans:
+        with span("generate_model"):
+            model = gen.generate_model()
+
+        with span("export"):
+            data = export_to_bytes(model, export_format, quality)
+
+    return data, spans
+
+def is_model_cached(job):
+    """Return whether the model of the job is in the artifact cache"""
+    cache = artifact_cache.cache
+    return cache is not None and cache.contains(job.cache_key())
+
+def get_cached_model(job):
+    """Return the model of the job in the artifact cache as an open file, or None if it isn't cached"""
+    cache = artifact_cache.cache
+
+    if cache:
+        return cache.get(job.cache_key())
+
+    return None
+
+def store_model(job, data):
+    """Store the generated model of the job in the artifact cache"""
+    cache = artifact_cache.cache
+
+    if cache:
+        cache.put(job.cache_key(), data)
+
+def submit_model(job, lane=None):
+    """Start generating the model of the job and return the future that will contain the file. Without a lane,
+       small models run in the fast lane. Raises CostLimitError if the model is predicted to be too expensive to generate
+    """
+    cost = cost_model.check(job)
+    if lane is None:
+        lane = job_pool.FAST_LANE if cost and cost.seconds <= FAST_LANE_SECONDS else job_pool.BULK_LANE
+
+    try:
+        future = job_pool.submit(export_model, job.generator, job.export_format, job.quality, deadline=get_deadline(job.generator_id), lane=lane)
+    except job_pool.QueueFullError:
+        metrics.rejected.inc()
+        raise
+
+    result = ModelFuture(future)
+
+    def done(future):
+        try:
+            data, spans = future.result()
+        except job_pool.JobCancelledError as ex:
+            reason = "deadline" if isinstance(ex, job_pool.DeadlineExceededError) else "abandoned"
+            logger.info("Stopped generating {0} ({1})".format(job.download_name, reason))
+            metrics.cancelled.inc(job.generator_id, reason)
+            result.set_running_or_notify_cancel()
+            result.set_exception(ex)
+            return
+        except Exception as ex:
+            metrics.errors.inc(job.generator_id)
+            result.set_running_or_notify_cancel()
+            result.set_exception(ex)
+            return
+
+        metrics.models.inc(job.generator_id, "generated")
+        metrics.record_spans(job.generator_id, spans)
+        result.set_running_or_notify_cancel()
+        result.set_result(data)
+
+    future.add_done_callback(done)
+    return result
+
+def wait_for_model(future):
+    """Wait for the model of a future and return it. When the client of the current request disconnects
+       in the meantime, generating the model is aborted and JobCancelledError is raised
+    """
+    # Only Waitress tells whether the client is still there
+    disconnected = request.environ.get('waitress.client_disconnected')
+    if disconnected is None:
+        return future.result()
+
+    while True:
+        try:
+            return future.result(timeout=DISCONNECT_CHECK_SECONDS)
+        except TimeoutError:
+            if disconnected():
+                future.abort()
+                return future.result()
+
+def load_model(job):
+    """Return the file of the model of the job, from the artifact cache or by generating it"""
+    reader = get_cached_model(job)
+
+    if reader:
+        metrics.models.inc(job.generator_id, "cache")
+        with reader:
+            return reader.read()
+
+    data = wait_for_model(submit_model(job))
+    store_model(job, data)
+
+    return data
+
+def load_encoded_model(job, encoding, data=None):
+    """Return the model of the job compressed with the encoding. Compressed models are kept in the artifact cache
+       next to the model itself, so each is compressed only once. The model is the provided data, or is loaded
+    """
+    cache = artifact_cache.cache
+    key = job.cache_key() + "." + encoding
+
+    reader = cache.get(key) if cache else None
+    if reader:
+        if data is None:
+            metrics.models.inc(job.generator_id, "cache")
+        with reader:
+            return reader.read()
+
+    if data is None:
+        data = load_model(job)
+
+    encoded = content_encoding.compress(data, encoding)
+    if cache:
+        cache.put(key, encoded)
+
+    return encoded
+
+def model_response(job, data=None):
+    """Create the response that sends the model of the job as an attachment, compressed if the client accepts it.
+       The model is the provided data, or is loaded from the artifact cache (or generated if it was evicted)
+    """
+    encoding = content_encoding.negotiate(request, job.export_format)
+    reader = get_cached_model(job) if data is None and not encoding else None
+
+    if encoding:
+        response = send_file(io.BytesIO(load_encoded_model(job, encoding, data)), as_attachment=True, download_name=job.download_name)
+        response.headers['Content-Encoding'] = encoding
+    elif reader:
+        metrics.models.inc(job.generator_id, "cache")
+        response = send_file(reader, as_attachment=True, download_name=job.download_name)
+    else:
+        response = send_file(io.BytesIO(data if data is not None else load_model(job)), as_attachment=True, download_name=job.download_name)
+
+    response.vary.add('Accept-Encoding')
+    return response
+
+def send_model(job):
+    """Send the model of the job to the client, serving it from the artifact cache
+       when an identical model was generated before
+    """
+    if is_model_cached(job):
+        logger.debug("Serving {0} from cache".format(job.download_name))
+        return model_response(job)
+
+    data = wait_for_model(submit_model(job))
+    store_model(job, data)
+
+    return model_response(job, data)
@@ -0,0 +1,236 @@
+from cadquery import exporters
+from cadquery.occ_impl.shapes import Shape, compound
+from OCP.BRep import BRep_Tool
+from OCP.BRepMesh import BRepMesh_IncrementalMesh
+from OCP.BRepTools import BRepTools
+from OCP.IMeshTools import IMeshTools_MeshAlgoType_Delabella, IMeshTools_Parameters
+from OCP.StlAPI import StlAPI_Writer
+from OCP.TopAbs import TopAbs_WIRE
+from OCP.TopExp import TopExp
+from OCP.TopLoc import TopLoc_Location
+from OCP.TopTools import TopTools_IndexedMapOfShape
+
+from generators.common import threemf
+
+import json
+import numpy as np
+import os
+import re
+import struct
+import tempfile
+
+from contextlib import contextmanager
+
+# The formats models can be exported to. GLB (binary glTF) is a coarse mesh for the previews in the web page.
+# The tessellation of the mesh formats that are meant for printing depends on the quality
+EXPORT_FORMATS = ("stl", "3mf", "step", "glb")
+TESSELLATED_FORMATS = ("stl", "3mf")
+
+# Tessellation of mesh files: the maximum distance (in mm) between the mesh and the real surface, and the
+# maximum angle (in radians) between neighbouring segments of a curve
+QUALITY_PRESETS = {
+    "draft": (0.2, 0.5),
+    "normal": (0.05, 0.2),
+    "fine": (0.01, 0.1),
+    # Only used for the previews in the web page, which are shown small and have to load quickly
+    "preview": (0.5, 0.8),
+}
+
+# Automatic quality uses the normal preset, unless the model is so large that this results in more triangles than
+# the limit below. Such models are exported as draft instead, which is still plenty for a slicer
+QUALITY_CHOICES = [('auto', 'Automatic'), ('draft', 'Draft'), ('normal', 'Normal'), ('fine', 'Fine')]
+DEFAULT_QUALITY = "auto"
+MAX_AUTO_TRIANGLES = int(os.environ.get('STL_MAX_TRIANGLES', 50000))
+
+# A mesh of the normal preset has about this many times as many triangles as the draft mesh of the same model
+# (2.0 to 2.6 for the benchmark models), so the draft mesh tells whether the normal one stays below the limit
+NORMAL_TRIANGLES_PER_DRAFT = 2.5
+
+# Faces with at least this many holes, like the top of a holey bin, are meshed with the Delabella algorithm. The
+# default algorithm slows down with every hole and takes over a minute for a face with a few thousand of them
+DELABELLA_MIN_HOLES = 50
+
+# A binary STL file is a header, followed by the normal, the three corners and an unused attribute of each triangle
+STL_HEADER_SIZE = 84
+STL_TRIANGLE = np.dtype([("normal", "<f4", 3), ("corners", "<f4", (3, 3)), ("attribute", "<u2")])
+
+def hole_count(face):
+    """Return the number of holes in a face. Counts the wires directly, CadQuery's innerWires() is much slower"""
+    wires = TopTools_IndexedMapOfShape()
+    TopExp.MapShapes_s(face.wrapped, TopAbs_WIRE, wires)
+    return wires.Extent() - 1
+
+def mesh(shape, quality):
+    """Tessellate the shape using the settings of a quality preset and return the number of triangles"""
+    tolerance, angularTolerance = QUALITY_PRESETS[quality]
+
+    BRepTools.Clean_s(shape.wrapped)
+
+    # The faces with many holes are meshed first, the mesh of the whole shape keeps their triangulation
+    holeyFaces = [face for face in shape.Faces() if hole_count(face) >= DELABELLA_MIN_HOLES]
+    if holeyFaces:
+        parameters = IMeshTools_Parameters()
+        parameters.Deflection = tolerance
+        parameters.Angle = angularTolerance
+        parameters.InParallel = True
+        parameters.MeshAlgo = IMeshTools_MeshAlgoType_Delabella
+        BRepMesh_IncrementalMesh(compound(*holeyFaces).wrapped, parameters)
+
+    BRepMesh_IncrementalMesh(shape.wrapped, tolerance, False, angularTolerance, True)
+
+    triangles = 0
+    for face in shape.Faces():
+        triangulation = BRep_Tool.Triangulation_s(face.wrapped, TopLoc_Location())
+        if triangulation:
+            triangles += triangulation.NbTriangles()
+
+    return triangles
+
+def tessellate(model, quality):
+    """Tessellate the model according to the quality and return it as a single shape"""
+    shape = model if isinstance(model, Shape) else compound(*model)
+
+    if quality == "auto":
+        # The draft mesh is the cheapest, and is all that large models get. Only small models are meshed again
+        if mesh(shape, "draft") * NORMAL_TRIANGLES_PER_DRAFT <= MAX_AUTO_TRIANGLES:
+            mesh(shape, "normal")
+    else:
+        mesh(shape, quality)
+
+    return shape
+
+def write_stl(shape, filename):
+    """Write a tessellated shape to a binary STL file"""
+    writer = StlAPI_Writer()
+    writer.ASCIIMode = False
+    writer.Write(shape.wrapped, filename)
+
+def export_stl(model, filename, quality):
+    """Export the model as a binary STL file, tessellated according to the quality"""
+    write_stl(tessellate(model, quality), filename)
+
+def mesh_arrays(shape):
+    """Return the triangles of a tessellated shape as an array with the three corners (x, y, z) of each triangle,
+       in counterclockwise order seen from outside the shape. Reading the triangulation from Python takes a call for
+       every node and triangle, so the STL writer of OpenCascade collects them instead, and its output is read in one go
+    """
+    with temporary_file("stl") as filename:
+        write_stl(shape, filename)
+
+        with open(filename, 'rb') as reader:
+            data = reader.read()
+
+    return np.frombuffer(data, STL_TRIANGLE, offset=STL_HEADER_SIZE)["corners"]
+
+def indexed_mesh(corners):
+    """Merge the corners of the triangles that are at the same position and return the positions (x, y, z) of the
+       vertices, and three vertex numbers for each triangle. Triangles that collapse are dropped
+    """
+    # Positions are compared as they are written to mesh files, to a tenth of a micrometre. Adding 0.0 turns
+    # -0.0 into 0.0, which would otherwise be a different vertex
+    positions = np.round(corners.reshape(-1, 3).astype(np.float64), 4) + 0.0
+    vertices, numbers = np.unique(positions, axis=0, return_inverse=True)
+
+    triangles = numbers.reshape(-1, 3)
+    collapsed = (triangles[:, 0] == triangles[:, 1]) | (triangles[:, 1] == triangles[:, 2]) | (triangles[:, 0] == triangles[:, 2])
+
+    return vertices, triangles[~collapsed]
+
+def glb_bytes(vertices, triangles):
+    """Pack a triangle mesh into a binary glTF (GLB) file with a single mesh and a plain grey material.
+       glTF is in metres with the Y axis up, so the model (in millimetres with the Z axis up) is scaled and rotated
+    """
+    positions = vertices.astype("<f4")
+    indices = triangles.astype("<u4")
+    buffer = positions.tobytes() + indices.tobytes()
+
+    gltf = {
+        "asset": {"version": "2.0", "generator": "Gridfinity Creator"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"mesh": 0, "rotation": [-0.7071068, 0, 0, 0.7071068], "scale": [0.001, 0.001, 0.001]}],
+        "meshes": [{"primitives": [{"attributes": {"POSITION": 0}, "indices": 1, "material": 0}]}],
+        "materials": [{"pbrMetallicRoughness": {"baseColorFactor": [0.6, 0.6, 0.6, 1.0], "metallicFactor": 0.0, "roughnessFactor": 0.8}}],
+        "buffers": [{"byteLength": len(buffer)}],
+        "bufferViews": [
+            {"buffer": 0, "byteOffset": 0, "byteLength": positions.nbytes, "target": 34962},
+            {"buffer": 0, "byteOffset": positions.nbytes, "byteLength": indices.nbytes, "target": 34963},
+        ],
+        "accessors": [
+            # The bounds of the positions are required by the format
+            {"bufferView": 0, "componentType": 5126, "count": len(positions), "type": "VEC3",
+             "min": positions.min(axis=0).tolist() if len(positions) else [0, 0, 0],
+             "max": positions.max(axis=0).tolist() if len(positions) else [0, 0, 0]},
+            {"bufferView": 1, "componentType": 5125, "count": indices.size, "type": "SCALAR"},
+        ],
+    }
+
+    # Both chunks must be a multiple of 4 bytes long, the JSON chunk is padded with spaces
+    content = json.dumps(gltf, separators=(",", ":")).encode("utf-8")
+    content += b" " * (-len(content) % 4)
+    buffer += b"\0" * (-len(buffer) % 4)
+
+    header = struct.pack("<4sII", b"glTF", 2, 12 + 8 + len(content) + 8 + len(buffer))
+    return header + struct.pack("<I4s", len(content), b"JSON") + content + struct.pack("<I4s", len(buffer), b"BIN\0") + buffer
+
+def export_glb(model, filename):
+    """Export a coarse tessellation of the model as a binary glTF file, for previews"""
+    shape = model if isinstance(model, Shape) else compound(*model)
+
+    mesh(shape, "preview")
+    vertices, triangles = indexed_mesh(mesh_arrays(shape))
+
+    with open(filename, 'wb') as writer:
+        writer.write(glb_bytes(vertices, triangles))
+
+def export_3mf(model, filename, quality):
+    """Export the model as a 3MF file, tessellated according to the quality"""
+    vertices, triangles = indexed_mesh(mesh_arrays(tessellate(model, quality)))
+
+    with open(filename, 'wb') as writer:
+        writer.write(threemf.package(threemf.model_xml(vertices, triangles)))
+
+def make_deterministic(data, export_format):
+    """Replace the parts of a file that differ every time it is written, so the same model always results in the same file.
+       STEP files contain the time they were written and a counter of the files written by the process
+    """
+    if export_format != "step":
+        return data
+
+    data = re.sub(rb"(FILE_NAME\('[^']*',)'[^']*'", rb"\1'1970-01-01T00:00:00'", data, count=1)
+    return re.sub(rb"(Open CASCADE STEP translator [0-9.]+) [0-9]+'", rb"\1'", data)
+
+def export_file(model, filename, export_format, quality):
+    if export_format == "stl":
+        export_stl(model, filename, quality)
+    elif export_format == "3mf":
+        export_3mf(model, filename, quality)
+    elif export_format == "glb":
+        export_glb(model, filename)
+    else:
+        exporters.export(model, filename, export_format.upper())
+
+@contextmanager
+def temporary_file(export_format):
+    """Provide the path of a file to export to, which is removed afterwards"""
+    if not hasattr(os, "memfd_create"):
+        # Not on Linux, fall back to a regular temporary file
+        with tempfile.TemporaryDirectory() as directory:
+            yield os.path.join(directory, "model." + export_format)
+        return
+
+    # The exporters of OpenCascade can only write to a path, so give them the path of an anonymous
+    # in-memory file. It disappears as soon as it is closed, so nothing is left behind if anything fails
+    fd = os.memfd_create("model")
+    try:
+        yield "/proc/self/fd/{0}".format(fd)
+    finally:
+        os.close(fd)
+
+def export_to_bytes(model, export_format, quality=DEFAULT_QUALITY):
+    """Export the model in the requested format ("stl", "3mf", "step" or "glb") and return the contents of the file"""
+    with temporary_file(export_format) as filename:
+        export_file(model, filename, export_format, quality)
+
+        with open(filename, 'rb') as reader:
+            return make_deterministic(reader.read(), export_format)
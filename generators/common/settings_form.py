@@ -1,5 +1,6 @@
 import os
 
+import content_cache
+
 def get_standard_settings_form():
-    with open(os.path.dirname(__file__) + '/settings_form.html', 'r') as reader:
-        return reader.read()    
\ No newline at end of file
+    return content_cache.read(os.path.dirname(__file__) + '/settings_form.html')    
\ No newline at end of file
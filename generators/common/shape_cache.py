@@ -0,0 +1,70 @@
+import dataclasses
+import logging
+import os
+import threading
+
+from collections import OrderedDict
+
+logger = logging.getLogger('GFG')
+
+class ShapeCache:
+    """In-process cache of intermediate shapes, evicting the least recently used entries when full"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, objects):
+        with self.lock:
+            self.entries[key] = objects
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+shape_cache = ShapeCache(int(os.environ.get('SHAPE_CACHE_ENTRIES', 64)))
+
+def grid_key(grid):
+    """Key representing all dimensions of the grid"""
+    return dataclasses.astuple(grid)
+
+def plane_key(workplane):
+    """Key representing the position and orientation of a workplane"""
+    plane = workplane.plane
+    return plane.origin.toTuple() + plane.xDir.toTuple() + plane.zDir.toTuple()
+
+def cached_stage(name, basePlane, key, build):
+    """Return the result of build(), which constructs the named stage on basePlane. If the stage was
+       built before on the same plane with the same key, a copy of the earlier result is returned instead.
+       The key must contain every setting the stage reads.
+    """
+    if shape_cache.max_entries <= 0:
+        return build()
+
+    full_key = (name, plane_key(basePlane)) + tuple(key)
+    objects = shape_cache.get(full_key)
+
+    if objects is None:
+        result = build()
+
+        # Some stages are optional and produce nothing
+        if result is None:
+            return None
+
+        objects = result.vals()
+        shape_cache.put(full_key, objects)
+    else:
+        logger.debug("Reusing {0}".format(name))
+
+    # Hand out copies, so the cached shapes are never modified (e.g. by meshing during export)
+    # and callers are free to add to the returned workplane
+    return basePlane.newObject([obj.copy() for obj in objects])
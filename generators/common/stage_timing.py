@@ -0,0 +1,41 @@
+import functools
+import threading
+import time
+
+from contextlib import contextmanager
+
+# The spans of the model being generated by the current thread. Spans are only recorded inside collect_spans()
+local = threading.local()
+
+@contextmanager
+def collect_spans():
+    """Record the spans of everything run inside the block, as a list of (stage, seconds)"""
+    spans = []
+    local.spans = spans
+    try:
+        yield spans
+    finally:
+        local.spans = None
+
+@contextmanager
+def span(stage):
+    """Measure the time spent in the block as a span of the stage"""
+    spans = getattr(local, "spans", None)
+    if spans is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans.append((stage, time.perf_counter() - start))
+
+def timed_stage(f):
+    """Decorator that records a span, named after the function, of every call of a construction stage"""
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        with span(f.__name__):
+            return f(*args, **kwargs)
+
+    return wrapper
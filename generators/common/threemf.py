@@ -0,0 +1,80 @@
+import io
+import math
+import re
+import zipfile
+
+# Path of the model in a 3MF package, and the files that tell readers where to find it
+MODEL_PATH = "3D/3dmodel.model"
+
+CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+ <Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+ <Default Extension="model" ContentType="application/vnd.ms-package.3dmanufacturing-3dmodel+xml"/>
+</Types>
+"""
+
+RELATIONSHIPS = """<?xml version="1.0" encoding="UTF-8"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+ <Relationship Target="/{0}" Id="rel0" Type="http://schemas.microsoft.com/3dmanufacturing/2013/01/3dmodel"/>
+</Relationships>
+""".format(MODEL_PATH)
+
+# Space between the copies of a model on the build plate, in mm
+SPACING_MM = 5
+
+def build_xml(offsets):
+    """The build section of a model, with an instance of the object at each of the (x, y) offsets"""
+    items = ['  <item objectid="1" transform="1 0 0 0 1 0 0 0 1 {0:.4f} {1:.4f} 0"/>'.format(x, y) for x, y in offsets]
+    return " <build>\n" + "\n".join(items) + "\n </build>"
+
+def model_xml(vertices, triangles):
+    """The model of a 3MF file containing a single object, placed once. The object is a mesh of the vertices
+       (an array of x, y and z) and the triangles (an array of three vertex numbers each)
+    """
+    # Formatting all vertices and all triangles in one go is much faster than one at a time
+    vertexLines = ('<vertex x="%.4f" y="%.4f" z="%.4f"/>\n' * len(vertices)) % tuple(vertices.ravel().tolist())
+    triangleLines = ('<triangle v1="%d" v2="%d" v3="%d"/>\n' * len(triangles)) % tuple(triangles.ravel().tolist())
+
+    return "".join([
+        '<?xml version="1.0" encoding="UTF-8"?>\n',
+        '<model unit="millimeter" xml:lang="en-US" xmlns="http://schemas.microsoft.com/3dmanufacturing/core/2015/02">\n',
+        ' <metadata name="Application">Gridfinity Creator</metadata>\n',
+        ' <resources>\n',
+        '  <object id="1" type="model">\n',
+        '   <mesh>\n',
+        '    <vertices>\n', vertexLines, '    </vertices>\n',
+        '    <triangles>\n', triangleLines, '    </triangles>\n',
+        '   </mesh>\n',
+        '  </object>\n',
+        ' </resources>\n',
+        build_xml([(0, 0)]), '\n',
+        '</model>\n',
+    ])
+
+def package(model):
+    """Pack the model into a 3MF file. The entries get a fixed date, so the same model always results in the same file"""
+    stream = io.BytesIO()
+    with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for path, content in (("[Content_Types].xml", CONTENT_TYPES), ("_rels/.rels", RELATIONSHIPS), (MODEL_PATH, model)):
+            archive.writestr(zipfile.ZipInfo(path, date_time=(1980, 1, 1, 0, 0, 0)), content, compress_type=zipfile.ZIP_DEFLATED)
+
+    return stream.getvalue()
+
+def replicate(data, copies):
+    """Return a 3MF file with the given number of copies of the object in a 3MF file, laid out in a grid on the build plate.
+       The copies are instances of the same object, so the mesh is still stored only once
+    """
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        model = archive.read(MODEL_PATH).decode("utf-8")
+
+    points = re.findall(r'<vertex x="([^"]+)" y="([^"]+)"', model)
+    xs = [float(x) for x, _ in points]
+    ys = [float(y) for _, y in points]
+    pitchX = max(xs) - min(xs) + SPACING_MM
+    pitchY = max(ys) - min(ys) + SPACING_MM
+
+    columns = math.ceil(math.sqrt(copies))
+    offsets = [((i % columns) * pitchX, (i // columns) * pitchY) for i in range(copies)]
+
+    model = re.sub(r" <build>.*</build>", lambda match: build_xml(offsets), model, flags=re.S)
+    return package(model)
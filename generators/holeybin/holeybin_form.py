@@ -5,8 +5,9 @@ from grid_constants import *
 from holeybin_settings import HoleShape
 
 import os
-import help_provider as help
+import content_cache
 from generators.common.settings_form import get_standard_settings_form
+from generators.common.model_export import DEFAULT_QUALITY, QUALITY_CHOICES
 
 class Form(FlaskForm):
     id = "holeybin"
@@ -24,24 +25,26 @@ class Form(FlaskForm):
     addRemovalHoles = BooleanField("Magnet removal holes", false_values=(False, "false", ""))
     addScrewHoles   = BooleanField("Screw holes", false_values=(False, "false", ""))
 
-    exportFormat    = SelectField('Export format', choices=[('stl', 'STL'), ('step', 'STEP')])
+    exportFormat    = SelectField('Export format', choices=[('stl', 'STL'), ('3mf', '3MF'), ('step', 'STEP')])
+    quality         = SelectField('STL quality', choices=QUALITY_CHOICES, default=DEFAULT_QUALITY)
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.numHolesX.description = help.get_holey_gridspec_help()
-        self.numHolesY.description = help.get_holey_gridspec_help()
-        self.holeDepth.description = help.get_holey_gridspec_help()
-        self.holeShape.description = help.get_holey_shape_help()
-        self.sizeUnitsX.description = help.get_holey_gridspec_help()
-        self.sizeUnitsY.description = help.get_holey_gridspec_help()
-        self.holeSize.description = help.get_holey_size_help()
-        self.keepoutDiameter.description = help.get_holey_keepout_help()
-        self.addStackingLip.description = help.get_stackinglip_help()
-        self.addMagnetHoles.description = help.get_magnet_help()
-        self.magnetHoleDiameter.description = help.get_magnet_help()
-        self.addRemovalHoles.description = help.get_magnet_help()
-        self.addScrewHoles.description = help.get_magnet_help()
-        self.exportFormat.description = help.get_exportformat_help()
+        self.numHolesX.description = "holey_numholes"
+        self.numHolesY.description = "holey_numholes"
+        self.holeDepth.description = "holey_numholes"
+        self.holeShape.description = "holey_shape"
+        self.sizeUnitsX.description = "holey_numholes"
+        self.sizeUnitsY.description = "holey_numholes"
+        self.holeSize.description = "holey_size"
+        self.keepoutDiameter.description = "holey_keepout"
+        self.addStackingLip.description = "stackinglip"
+        self.addMagnetHoles.description = "magnet"
+        self.magnetHoleDiameter.description = "magnet"
+        self.addRemovalHoles.description = "magnet"
+        self.addScrewHoles.description = "magnet"
+        self.exportFormat.description = "export_format"
+        self.quality.description = "quality"
 
         self.numHolesX.onChangedCallback = "onNumHolesChanged()"
         self.numHolesY.onChangedCallback = "onNumHolesChanged()"
@@ -54,7 +57,7 @@ class Form(FlaskForm):
         return [
             ["Hole grid", [self.numHolesX, self.numHolesY, self.sizeUnitsX, self.sizeUnitsY, self.keepoutDiameter]],
             ["Holes", [self.holeShape, self.holeSize, self.holeDepth]],
-            ["Other", [self.addStackingLip, self.exportFormat]],
+            ["Other", [self.addStackingLip, self.exportFormat, self.quality]],
             ["Magnets", [self.addMagnetHoles, self.addRemovalHoles, self.addScrewHoles, self.magnetHoleDiameter]],
         ]
     
@@ -62,9 +65,7 @@ class Form(FlaskForm):
         return "Holey bin"
 
     def get_settings_html(self):
-        with open(os.path.dirname(__file__) + '/holeybin_settings_form.html', 'r') as reader:
-            return reader.read()   
+        return content_cache.read(os.path.dirname(__file__) + '/holeybin_settings_form.html')   
 
     def get_description(self):
-        with open(os.path.dirname(__file__) + '/holeybin_description.html', 'r') as reader:
-            return reader.read()    
\ No newline at end of file
+        return content_cache.read(os.path.dirname(__file__) + '/holeybin_description.html')    
\ No newline at end of file
@@ -1,10 +1,12 @@
 import cadquery as cq
-from cadquery import exporters
 from grid_constants import *
 import math
 from holeybin_settings import HoleShape
 
+from generators.common.assembly import fuse_touching
 from generators.common.bin_base import bin_base
+from generators.common.shape_cache import cached_stage, grid_key
+from generators.common.stage_timing import span, timed_stage
 
 class Generator:
     def __init__(self, settings, grid) -> None:
@@ -28,9 +30,13 @@ class Generator:
         self.internalSizeY = self.brickSizeY-2*self.grid.WALL_THICKNESS
         self.compartmentSizeZ = (self.settings.sizeUnitsZ-1)*self.grid.HEIGHT_UNITSIZE_MM
 
+    @timed_stage
     def outer_wall(self, basePlane):
         """Create the outer wall of the bin"""
+        key = (self.brickSizeX, self.brickSizeY, self.compartmentSizeZ, grid_key(self.grid))
+        return cached_stage("holeybin.outer_wall", basePlane, key, lambda: self.build_outer_wall(basePlane))
 
+    def build_outer_wall(self, basePlane):
         sizeZ = self.compartmentSizeZ
 
         wall = basePlane.box(self.brickSizeX, self.brickSizeY, sizeZ, centered=False, combine = False)
@@ -39,7 +45,13 @@ class Generator:
                    
         return result
 
+    @timed_stage
     def stacking_lip(self, basePlane):
+        """Create the stacking lip on top of the bin"""
+        key = (self.brickSizeX, self.brickSizeY, self.compartmentSizeZ, self.settings.addStackingLip, grid_key(self.grid))
+        return cached_stage("holeybin.stacking_lip", basePlane, key, lambda: self.build_stacking_lip(basePlane))
+
+    def build_stacking_lip(self, basePlane):
         if self.settings.addStackingLip:
             thickness = self.grid.WALL_THICKNESS
 
@@ -65,7 +77,9 @@ class Generator:
 
             return result
         
-    def holey_grid(self, basePlane):
+    @timed_stage
+    def holey_grid(self, basePlane, base, wall):
+        """Cut the grid of holes into the top of the wall. Returns the base and the wall, in parts that only touch each other"""
 
         # Calculate step-size based on actual internal size to spread the holes evenly across the bin
         x_step = self.internalSizeX / self.settings.numHolesX
@@ -75,21 +89,54 @@ class Generator:
         offset_x = (self.brickSizeX - self.internalSizeX) / 2 + x_step / 2
         offset_y = (self.brickSizeY - self.internalSizeY) / 2 + y_step / 2
 
-        # Create the grid of points where the holes go
-        hole_points = []
+        # Every hole is a copy of the same hole, moved to its place in the grid. Moved copies share their geometry,
+        # so this is cheap even for thousands of holes
+        top = wall.faces(">Z")
+        profile = self.hole_profile(top.Center().z)
+        holes = []
         for x in range(self.settings.numHolesX):
             for y in range(self.settings.numHolesY):
-                hole_points.append((x*x_step + offset_x, y*y_step + offset_y))
-                
-        # Extrude the holes based on the shape setting
+                holes.append(profile.moved(cq.Location(cq.Vector(x*x_step + offset_x, y*y_step + offset_y, 0))))
+
+        if self.holes_are_separate(x_step, y_step):
+            # The top of the wall is extruded from its outline with the holes in it, which doesn't need a boolean
+            # operation at all. Below the holes, the wall is solid
+            with span("hole_array"):
+                outline = top.outerWire()
+                result = basePlane.newObject([base, cq.Solid.extrudeLinear(outline, holes, cq.Vector(0, 0, -self.settings.holeDepth))])
+
+                if self.settings.holeDepth < self.compartmentSizeZ:
+                    bottom = outline.translate((0, 0, -self.settings.holeDepth))
+                    result.add(cq.Solid.extrudeLinear(bottom, [], cq.Vector(0, 0, self.settings.holeDepth - self.compartmentSizeZ)))
+
+                return result
+
+        # Holes that overlap, or that reach into the base, are all cut in a single boolean operation
+        with span("hole_cut"):
+            direction = cq.Vector(0, 0, -self.settings.holeDepth)
+            tools = [cq.Solid.extrudeLinear(hole, [], direction) for hole in holes]
+            return basePlane.newObject(cq.Compound.makeCompound([base, wall]).cut(*tools).Solids())
+
+    def hole_profile(self, z):
+        """Return the outline of a single hole, centered on the Z axis at height z"""
+        radius = self.settings.holeSize / 2
+
         if self.settings.holeShape == "HEXAGON":
-            result = basePlane.pushPoints(hole_points).polygon(6, self.settings.holeSize).extrude(-self.settings.holeDepth, combine="cut")
+            corners = [(radius*math.cos(i*math.pi/3), radius*math.sin(i*math.pi/3), z) for i in range(6)]
+            return cq.Wire.makePolygon(corners, close=True)
         elif self.settings.holeShape == "SQUARE":
-            result = basePlane.pushPoints(hole_points).rect(self.settings.holeSize, self.settings.holeSize).extrude(-self.settings.holeDepth, combine="cut")
+            corners = [(-radius, -radius, z), (radius, -radius, z), (radius, radius, z), (-radius, radius, z)]
+            return cq.Wire.makePolygon(corners, close=True)
         else: # By default, use HoleShape.CIRCLE
-            result = basePlane.pushPoints(hole_points).hole(self.settings.holeSize, self.settings.holeDepth)
-        
-        return result
+            return cq.Wire.makeCircle(radius, cq.Vector(0, 0, z), cq.Vector(0, 0, 1))
+
+    def holes_are_separate(self, x_step, y_step):
+        """Check whether the holes stay clear of each other and of the outside of the bin, and end within the wall"""
+        # A hexagon has a corner in the X direction and a flat side in the Y direction
+        sizeX = self.settings.holeSize
+        sizeY = self.settings.holeSize * (math.sqrt(3)/2 if self.settings.holeShape == "HEXAGON" else 1)
+
+        return 0 < sizeX < x_step and 0 < sizeY < y_step and 0 < self.settings.holeDepth <= self.compartmentSizeZ
 
     def validate_settings(self):
         """Do some sanity checking on the settings to prevent impossible or unreasonable results"""
@@ -103,30 +150,28 @@ class Generator:
         plane = cq.Workplane("XY")
 
         # First create the base
-        result = bin_base(plane, self.settings, self.grid)
+        base = bin_base(plane, self.settings, self.grid)
 
         # Continue at the top of the base
-        plane = result.faces(">Z").workplane()
+        plane = base.faces(">Z").workplane()
 
-        # Add the outer wall
-        result.add(self.outer_wall(plane))
+        # Create the outer wall
+        wall = self.outer_wall(plane)
         
         # Continue from the top of the bin
-        plane = result.faces(">Z").workplane()
+        plane = wall.faces(">Z").workplane()
 
-        # Create the hole-grid in the same plane as the previous operation
-        result = self.holey_grid(plane)
+        # Create the hole-grid in the top of the wall
+        result = self.holey_grid(plane, base.val(), wall.val())
 
         # Add the stacking lip
-        result.add(self.stacking_lip(plane))
+        lip = self.stacking_lip(plane)
+        if lip is not None:
+            result.add(lip)
 
-        # Combine everything together
-        result = result.combine(clean=True)
+        # Combine everything together. The parts only touch each other, so they can be fused in a single fast pass.
+        # Every boolean operation on a wall with thousands of holes takes seconds, however simple it is
+        with span("combine"):
+            result = result.newObject([fuse_touching(result.vals())])
 
         return result
-
-    def generate_stl(self, filename):
-        model = self.generate_model()
-        exporters.export(model, filename)
-
-
@@ -1,22 +1,21 @@
-from flask import send_file, Flask, after_this_request
-
 import generators.holeybin.holeybin_generator as generator
 import generators.holeybin.holeybin_form as form
 import generators.holeybin.holeybin_settings as settings
 import grid_constants
 
-import uuid
-import os
 import logging
 
 from holeybin_settings import HoleShape
+from generators.common.model_download import ModelJob, send_model
+from generators.common.model_export import DEFAULT_QUALITY
 
 logger = logging.getLogger('HBG')
 
 def get_generator(settings):
     return generator.Generator(settings)
 
-def process(form, constants):
+def get_job(form, constants):
+    """Create the job that generates the model specified in the form"""
     # Copy the settings from the form
     s = settings.Settings()
     s.numHolesX = form.numHolesX.data
@@ -34,39 +33,29 @@ def process(form, constants):
     s.addRemovalHoles = form.addRemovalHoles.data
     s.addScrewHoles = form.addScrewHoles.data
 
+    return create_job(s, constants, form.exportFormat.data, form.quality.data)
+
+def create_job(s, constants, exportFormat, quality=DEFAULT_QUALITY):
+    """Create the job that generates a model with the provided settings"""
     # Default grid (Gridfinity)
     if not constants:
         g = grid_constants.Grid()
     else:
         g = constants
     
-    # Construct the names for the temporary and downloaded file
-    filename = "/tmpfiles/" + str(uuid.uuid4()) + "." + form.exportFormat.data
-
     logger.info(s)
 
-    # Generate the STL file
     gen = generator.Generator(s, g)
-    gen.generate_stl(filename)
-
-    logger.debug("Generating completed")
-
-    # Delete the temp file after it was downloaded
-    @after_this_request
-    def delete_image(response):
-        try:
-            os.remove(filename)
-        except Exception as ex:
-            print(ex)
-        return response
 
+    downloadName = "HoleyBin_{0}x{1}x{2}.{3}".format(s.numHolesX, s.numHolesY, s.holeDepth, exportFormat)
+    return ModelJob(form.Form.id, gen, exportFormat, downloadName, quality)
 
+def process(form, constants):
     # Send the generated STL file to the client
-    downloadName = "HoleyBin_{0}x{1}x{2}.{3}".format(s.numHolesX, s.numHolesY, s.holeDepth, form.exportFormat.data)
-    return send_file(filename, as_attachment=True, download_name=downloadName)
+    return send_model(get_job(form, constants))
 
-def get_form():
-    return form.Form()
+def get_form(csrf=True):
+    return form.Form() if csrf else form.Form(meta={'csrf': False})
 
 def handles(request, form):
     if form.id in request.form and form.validate_on_submit():
@@ -3,8 +3,9 @@ from wtforms import IntegerField, SelectField, BooleanField
 from wtforms.widgets import NumberInput
 from grid_constants import *
 import os
-import help_provider as help
+import content_cache
 from generators.common.settings_form import get_standard_settings_form
+from generators.common.model_export import DEFAULT_QUALITY, QUALITY_CHOICES
 
 class Form(FlaskForm):
     id = "lightbin"
@@ -13,21 +14,23 @@ class Form(FlaskForm):
     sizeUnitsZ     = IntegerField("Height", widget=NumberInput(min = 1, max = Grid.MAX_HEIGHT_UNITS), default=6)
     addStackingLip = BooleanField("Stacking lip", default="True")
     addLabelRidge  = BooleanField("Add label tab", default="True", false_values=(False, "false", ""))
-    exportFormat   = SelectField('Export format', choices=[('stl', 'STL'), ('step', 'STEP')])
+    exportFormat   = SelectField('Export format', choices=[('stl', 'STL'), ('3mf', '3MF'), ('step', 'STEP')])
+    quality        = SelectField('STL quality', choices=QUALITY_CHOICES, default=DEFAULT_QUALITY)
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.sizeUnitsX.description = help.get_size_help()
-        self.sizeUnitsY.description = help.get_size_help()
-        self.sizeUnitsZ.description = help.get_size_help()
-        self.addStackingLip.description = help.get_stackinglip_help()
-        self.exportFormat.description = help.get_exportformat_help()
-        self.addLabelRidge.description = help.get_labeltab_help()
+        self.sizeUnitsX.description = "size"
+        self.sizeUnitsY.description = "size"
+        self.sizeUnitsZ.description = "size"
+        self.addStackingLip.description = "stackinglip"
+        self.exportFormat.description = "export_format"
+        self.quality.description = "quality"
+        self.addLabelRidge.description = "labeltab"
 
     def get_rows(self):
         return [
             ["Size", [self.sizeUnitsX, self.sizeUnitsY, self.sizeUnitsZ]],
-            ["Options", [self.addStackingLip, self.addLabelRidge, self.exportFormat]],
+            ["Options", [self.addStackingLip, self.addLabelRidge, self.exportFormat, self.quality]],
         ]
     
     def get_title(self):
@@ -37,5 +40,4 @@ class Form(FlaskForm):
         return get_standard_settings_form()
 
     def get_description(self):
-        with open(os.path.dirname(__file__) + '/lightbin_description.html', 'r') as reader:
-            return reader.read()       
+        return content_cache.read(os.path.dirname(__file__) + '/lightbin_description.html')       
@@ -1,9 +1,11 @@
 import cadquery as cq
-from cadquery import exporters
 from grid_constants import *
 import time
 import logging
 
+from generators.common.assembly import fuse_touching
+from generators.common.stage_timing import span, timed_stage
+
 logger = logging.getLogger('LBG')
 
 class Generator:
@@ -56,6 +58,7 @@ class Generator:
 
         return baseUnit
 
+    @timed_stage
     def grid_base(self, basePlane):
         """Construct a base of WidthxLength grid units"""
         
@@ -69,6 +72,7 @@ class Generator:
 
         return result
 
+    @timed_stage
     def brick_floor(self, basePlane):
         """Create a floor covering all unit bases"""
 
@@ -91,12 +95,13 @@ class Generator:
         floor = floor.edges(s).chamfer(self.grid.LIGHT_FLOOR_THICKNESS-self.grid.CHAMFER_EPSILON)
         floor = floor.translate((self.grid.BRICK_UNIT_SIZE_X/2, self.grid.BRICK_UNIT_SIZE_Y/2, self.grid.LIGHT_FLOOR_THICKNESS/2))
 
-        result = basePlane
+        tiles = []
         for x in range(self.settings.sizeUnitsX):
             for y in range(self.settings.sizeUnitsY):
-                result.add(floor.translate((x*self.grid.GRID_UNIT_SIZE_X_MM, y*self.grid.GRID_UNIT_SIZE_Y_MM, 0)))
+                tiles.append(floor.val().translate((x*self.grid.GRID_UNIT_SIZE_X_MM, y*self.grid.GRID_UNIT_SIZE_Y_MM, 0)))
         
-        result = result.combine()
+        # Neighbouring tiles share a side, so they can be fused in a single fast pass
+        result = basePlane.newObject([fuse_touching(tiles, clean=False)])
         
         # Create 
         plane = cq.Workplane("XY")
@@ -110,6 +115,7 @@ class Generator:
     
         return result
 
+    @timed_stage
     def outer_wall(self, basePlane):
         """Create the outer wall of the bin"""
         
@@ -143,6 +149,7 @@ class Generator:
             
         return result
     
+    @timed_stage
     def label_tab(self, basePlane):
         """Construct the pickup/label tab"""
 
@@ -203,11 +210,7 @@ class Generator:
             result.add(self.label_tab(plane))      
 
         # Combine everything together
-        result = result.combine()
+        with span("combine"):
+            result = result.combine()
 
         return result
-
-    def generate_stl(self, filename):
-        model = self.generate_model()
-        exporters.export(model, filename)
-
@@ -14,5 +14,5 @@ class Settings:
     addLabelRidge:  bool = True  # Add a ridge to pick up the bin and attach a label
     multiLabel:     bool = False # Add a ridge to every row of compartments?
 
-    labelRidgeWidth:  int = 13   
-    wallThickness: int = 1.5
\ No newline at end of file
+    labelRidgeWidth:  float = 13.0
+    wallThickness: float = 1.5
\ No newline at end of file
@@ -1,20 +1,20 @@
-from flask import send_file, Flask, after_this_request
-
 import solidbin_generator as generator
 import solidbin_form as form
 import solidbin_settings as settings
 import grid_constants
 
-import uuid
-import os
 import logging
 
+from generators.common.model_download import ModelJob, send_model
+from generators.common.model_export import DEFAULT_QUALITY
+
 logger = logging.getLogger('SBG')
 
 def get_generator(settings):
     return generator.Generator(settings)
 
-def process(form, constants):
+def get_job(form, constants):
+    """Create the job that generates the model specified in the form"""
     # Copy the settings from the form
     s = settings.Settings()
     s.sizeUnitsX = form.sizeUnitsX.data
@@ -25,37 +25,30 @@ def process(form, constants):
     s.magnetHoleDiameter = float(form.magnetHoleDiameter.data)
     s.addRemovalHoles = form.addRemovalHoles.data
     s.addScrewHoles = form.addScrewHoles.data
-    
+
+    return create_job(s, constants, form.exportFormat.data, form.quality.data)
+
+def create_job(s, constants, exportFormat, quality=DEFAULT_QUALITY):
+    """Create the job that generates a model with the provided settings"""
     # Default grid (Gridfinity)
     if not constants:
         g = grid_constants.Grid()
     else:
         g = constants
     
-    # Construct the names for the temporary and downloaded file
-    filename = "/tmpfiles/" + str(uuid.uuid4()) + "." + form.exportFormat.data
-
-    # Generate the STL file
     gen = generator.Generator(s, g)
-    gen.generate_stl(filename)
-
-    # Delete the temp file after it was downloaded
-    @after_this_request
-    def delete_image(response):
-        try:
-            os.remove(filename)
-        except Exception as ex:
-            print(ex)
-        return response
 
     logger.info(s)
 
+    downloadName = "Solid Bin {0}x{1}x{2}.{3}".format(s.sizeUnitsX, s.sizeUnitsY, s.sizeUnitsZ, exportFormat)
+    return ModelJob(form.Form.id, gen, exportFormat, downloadName, quality)
+
+def process(form, constants):
     # Send the generated STL file to the client
-    downloadName = "Solid Bin {0}x{1}x{2}.{3}".format(s.sizeUnitsX, s.sizeUnitsY, s.sizeUnitsZ, form.exportFormat.data)
-    return send_file(filename, as_attachment=True, download_name=downloadName)
+    return send_model(get_job(form, constants))
 
-def get_form():
-    return form.Form()
+def get_form(csrf=True):
+    return form.Form() if csrf else form.Form(meta={'csrf': False})
 
 def handles(request, form):
     if form.id in request.form and form.validate_on_submit():
@@ -3,7 +3,9 @@ from wtforms import IntegerField, DecimalField, SelectField, BooleanField
 from wtforms.widgets import NumberInput
 from grid_constants import *
 import os
+import content_cache
 from generators.common.settings_form import get_standard_settings_form
+from generators.common.model_export import DEFAULT_QUALITY, QUALITY_CHOICES
 
 class Form(FlaskForm):
     id = "solidbin"
@@ -15,7 +17,8 @@ class Form(FlaskForm):
     magnetHoleDiameter = DecimalField("Magnet-hole diameter", default = 6.5, places = 2)
     addRemovalHoles = BooleanField("Magnet removal holes", default="False")
     addScrewHoles   = BooleanField("Screw holes", default="False")
-    exportFormat    = SelectField('Export format', choices=[('stl', 'STL'), ('step', 'STEP')])
+    exportFormat    = SelectField('Export format', choices=[('stl', 'STL'), ('3mf', '3MF'), ('step', 'STEP')])
+    quality         = SelectField('STL quality', choices=QUALITY_CHOICES, default=DEFAULT_QUALITY)
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -24,7 +27,7 @@ class Form(FlaskForm):
         return [
           ["Size", [self.sizeUnitsX, self.sizeUnitsY, self.sizeUnitsZ]],
           ["Magnets", [self.addMagnetHoles, self.addRemovalHoles, self.addScrewHoles, self.magnetHoleDiameter]],
-          ["Other", [self.addStackingLip, self.exportFormat]],
+          ["Other", [self.addStackingLip, self.exportFormat, self.quality]],
         ]
     
     def get_title(self):
@@ -34,6 +37,5 @@ class Form(FlaskForm):
         return get_standard_settings_form()
 
     def get_description(self):
-        with open(os.path.dirname(__file__) + '/solidbin_description.html', 'r') as reader:
-            return reader.read()    
+        return content_cache.read(os.path.dirname(__file__) + '/solidbin_description.html')    
         
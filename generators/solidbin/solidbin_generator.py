@@ -1,8 +1,9 @@
 import cadquery as cq
-from cadquery import exporters
 from grid_constants import *
 
 from generators.common.bin_base import bin_base
+from generators.common.shape_cache import cached_stage, grid_key
+from generators.common.stage_timing import span, timed_stage
 
 class Generator:
     def __init__(self, settings, grid) -> None:
@@ -22,9 +23,13 @@ class Generator:
         self.internalSizeY = self.brickSizeY-2*self.grid.WALL_THICKNESS
         self.compartmentSizeZ = (self.settings.sizeUnitsZ-1)*self.grid.HEIGHT_UNITSIZE_MM
 
+    @timed_stage
     def outer_wall(self, basePlane):
         """Create the outer wall of the bin"""
+        key = (self.brickSizeX, self.brickSizeY, self.compartmentSizeZ, self.settings.addStackingLip, grid_key(self.grid))
+        return cached_stage("solidbin.outer_wall", basePlane, key, lambda: self.build_outer_wall(basePlane))
 
+    def build_outer_wall(self, basePlane):
         # Allow creation of a 1-unit height bin (just the base)
         if self.compartmentSizeZ == 0:
             return
@@ -77,12 +82,7 @@ class Generator:
         result.add(self.outer_wall(plane))
         
         # Combine everything together
-        result = result.combine(clean=True)
+        with span("combine"):
+            result = result.combine(clean=True)
 
         return result
-
-    def generate_stl(self, filename):
-        model = self.generate_model()
-        exporters.export(model, filename)
-
-
@@ -1,3 +1,6 @@
+import dataclasses
+import functools
+import hashlib
 import importlib
 import logging
 import logging.handlers
@@ -7,13 +10,25 @@ import waitress
 
 from contextlib import contextmanager
 
-from flask import Flask, make_response, request
+from flask import Flask, Response, abort, jsonify, make_response, redirect, request, stream_with_context, url_for
+from flask_wtf.csrf import generate_csrf
 from jinja2 import Environment, FileSystemLoader, StrictUndefined, Template
 from werkzeug.middleware.proxy_fix import ProxyFix
 
+import artifact_cache
+import batch
+import content_cache
+import content_encoding
+import cost_model
 import grid_constants
+import help_provider
+import job_pool
+import jobs
+import metrics
+import model_urls
 from grid_constants import *
 from version import __version__
+from generators.common.model_download import load_encoded_model, load_model, model_response
 
 app = Flask(__name__)
 
@@ -32,63 +47,105 @@ logger = None
 # Constants
 GEN_FOLDER = "./generators"
 MAIN_MODULE = "main.py"
+HELP_MAX_AGE_SECONDS = 24*60*60
+PAGE_MAX_AGE_SECONDS = 10*60
+PAGE_CACHE_ENTRIES = 16
+MODEL_MAX_AGE_SECONDS = 365*24*60*60
+MODEL_MIMETYPES = {"3mf": "model/3mf", "glb": "model/gltf-binary"}
+CHANNEL_REQUEST_LOOKAHEAD = 5
+
+# The rendered index page is cached, except in debug mode where templates may change
+cache_pages = True
+
+@functools.lru_cache(maxsize=64)
+def compile_template(source):
+    return Template(source)
 
 def inner_render(value, context):
-    return Template(value).render(context)
+    return compile_template(value).render(context)
 
-def render_index(form_list, constants, message):
-    jinja_env = Environment(loader=FileSystemLoader(["./", os.path.realpath(__file__)]), undefined=StrictUndefined)
-    jinja_env.filters["inner_render"] = inner_render
+# Templates are compiled once and kept. In debug mode they are recompiled when they change
+jinja_env = Environment(loader=FileSystemLoader(["./", os.path.realpath(__file__)]), undefined=StrictUndefined, auto_reload=False)
+jinja_env.filters["inner_render"] = inner_render
 
+def render_index(form_list, constants, message, script_root, csrf_token=""):
     index_template = jinja_env.get_template("templates/index.html.j2")
     return index_template.render(version=__version__, forms=form_list, message=message, gridsize_x=constants.GRID_UNIT_SIZE_X_MM,
-                            gridsize_y=constants.GRID_UNIT_SIZE_Y_MM, gridsize_z=constants.HEIGHT_UNITSIZE_MM)
+                            gridsize_y=constants.GRID_UNIT_SIZE_Y_MM, gridsize_z=constants.HEIGHT_UNITSIZE_MM, script_root=script_root,
+                            csrf_token=csrf_token)
 
-# Handle GET requests for "/"
-@app.route('/', methods=['GET'])
-def index_get():
+def get_gridspec():
+    """Return the grid size (X, Y and Z) saved in the grid spec cookie, or None if there is no such cookie"""
+    if not request.cookies.get('gridspec'):
+        return None
+
+    values = request.cookies.get('gridspec').split(',')
+    return (float(values[0]), float(values[1]), float(values[2]))
 
+def make_constants(gridspec):
+    """Construct the grid constants for a grid size. The default (Gridfinity) grid is used if gridspec is None"""
     constants = grid_constants.Grid()
 
-    # If a grid spec cookie is found, set the values contained in it
-    if request.cookies.get('gridspec'):
-        values = request.cookies.get('gridspec').split(',')
-        constants.GRID_UNIT_SIZE_X_MM = float(values[0])
-        constants.GRID_UNIT_SIZE_Y_MM = float(values[1])
-        constants.HEIGHT_UNITSIZE_MM = float(values[2])
+    if gridspec:
+        constants.GRID_UNIT_SIZE_X_MM, constants.GRID_UNIT_SIZE_Y_MM, constants.HEIGHT_UNITSIZE_MM = gridspec
 
     constants.recalculate() # Recalculate derived measures
 
+    return constants
+
+def get_constants():
+    """Construct the grid constants for the current request. The default (Gridfinity) grid is used,
+       unless a grid spec cookie is found
+    """
+    return make_constants(get_gridspec())
+
+def render_page(script_root):
+    """Render the index page and return it together with its ETag. The script root is the path the server is
+       mounted under, the page uses it to reach the other endpoints
+    """
     form_list = []
 
-    # Create a list of forms to pass to Jinja for rendering
+    # Create a list of forms to pass to Jinja for rendering. The page is shared by all clients, so the forms
+    # don't get the CSRF token of a session (and rendering them doesn't start one)
     for gen in generators:
-        form_list.append(gen.get_form())
+        form_list.append(gen.get_form(csrf=False))
 
-    response = make_response(render_index(form_list, constants, ''))
+    # The page shows the default grid, its script fills in the grid of the gridspec cookie
+    page = render_index(form_list, make_constants(None), '', script_root)
+    return page, hashlib.sha256(page.encode("utf-8")).hexdigest()
 
-    if not request.cookies.get('gridspec'):
-        response.set_cookie('gridspec', str('{0},{1},{2}').format(constants.GRID_UNIT_SIZE_X_MM, constants.GRID_UNIT_SIZE_Y_MM, constants.HEIGHT_UNITSIZE_MM))
-    
+# Everything the page shows is fixed while the server runs, so it only has to be rendered once
+render_cached_page = functools.lru_cache(maxsize=PAGE_CACHE_ENTRIES)(render_page)
+
+# Handle GET requests for "/"
+@app.route('/', methods=['GET'])
+def index_get():
+    page, etag = render_cached_page(request.script_root) if cache_pages else render_page(request.script_root)
+
+    # The page is the same for everyone, so shared caches keep a single copy. It doesn't depend on the cookies
+    # of the client, and doesn't set any: without a gridspec cookie, the default grid is used anyway
+    response = make_response(page)
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = PAGE_MAX_AGE_SECONDS
+
+    return response.make_conditional(request)
+
+# Handle GET requests for a CSRF token. The index page is shared by all clients, so it can't contain the token of a session
+@app.route('/csrf-token', methods=['GET'])
+def csrf_token_get():
+    response = jsonify(token=generate_csrf())
+    response.cache_control.no_store = True
     return response
 
 # Handle POST requests for "/"
 @app.route('/', methods=['POST'])
 def index_post():
-    # Default gridspec
-    constants = grid_constants.Grid()
+    # Use the saved grid size if it was overridden
+    constants = get_constants()
 
     message = ""
 
-    # Use the saved grid size if it was overridden
-    if request.cookies.get('gridspec'):
-        c = request.cookies.get('gridspec')
-        values = c.split(',')
-        constants.GRID_UNIT_SIZE_X_MM = float(values[0])
-        constants.GRID_UNIT_SIZE_Y_MM = float(values[1])
-        constants.HEIGHT_UNITSIZE_MM = float(values[2])
-        constants.recalculate()  # Recalculate derived measures
-
 
     # If the request is from the form that specifies the grid size, override these values
     if 'advanced_settings' in request.form:
@@ -108,11 +165,217 @@ def index_post():
             # Generate an STL with the provided settings
             logger.info("Generating {0} for: {1}".format(f.get_title(), request.remote_addr))
             return gen.process(f, constants)
-    
-    response = make_response(render_index(form_list, constants, message))
+
+        # Without JavaScript, the shared page has no CSRF token. This page contains one, so submitting again works
+        if f.id in request.form and 'csrf_token' in f.errors:
+            message = "Your session has expired, please submit the form again"
+
+    # This page is only for this client, with the CSRF token of its session
+    response = make_response(render_index(form_list, constants, message, request.script_root, generate_csrf()))
+    response.cache_control.no_store = True
     response.set_cookie('gridspec', str('{0},{1},{2}').format(constants.GRID_UNIT_SIZE_X_MM, constants.GRID_UNIT_SIZE_Y_MM, constants.HEIGHT_UNITSIZE_MM))
     return response
 
+def job_status(job):
+    """Describe the status of a background job"""
+    status = {
+        "id": job.id,
+        "status": job.status(),
+        "name": job.download_name,
+    }
+
+    if job.status() == "done":
+        status["download"] = url_for('job_download', job_id=job.id)
+    elif job.status() in ("queued", "running") and jobs.JOB_ABANDON_SECONDS:
+        # The client has to poll again within this time, or the job is abandoned
+        status["poll_within"] = jobs.JOB_ABANDON_SECONDS
+
+    if job.error:
+        status["error"] = job.error
+
+    status["url"] = request.script_root + model_urls.model_url(job.model_job)
+
+    return status
+
+# Handle POST requests for "/jobs". Accepts the same forms as "/", but starts generating the model in
+# the background and immediately returns the id of the job instead of waiting for the model
+@app.route('/jobs', methods=['POST'])
+def jobs_post():
+    constants = get_constants()
+
+    for gen in generators:
+        # Find the generator for this request
+        f = gen.get_form()
+        if gen.handles(request, f):
+            logger.info("Submitting {0} for: {1}".format(f.get_title(), request.remote_addr))
+            job = jobs.store.submit(gen.get_job(f, constants))
+
+            response = jsonify(job_status(job))
+            response.status_code = 202
+            response.headers['Location'] = url_for('job_get', job_id=job.id)
+            return response
+
+    return jsonify(error="No generator accepted the submitted form"), 400
+
+# Handle GET requests for the status of a background job
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_get(job_id):
+    job = jobs.store.get(job_id)
+    if job is None:
+        abort(404)
+
+    return jsonify(job_status(job))
+
+# Handle GET requests for the result of a background job
+@app.route('/jobs/<job_id>/download', methods=['GET'])
+def job_download(job_id):
+    job = jobs.store.get(job_id)
+    if job is None:
+        abort(404)
+
+    if job.status() != "done":
+        response = jsonify(job_status(job))
+        response.status_code = 409
+        return response
+
+    return model_response(job.model_job)
+
+# Handle POST requests for "/batch": generate a list of models at once and return them in a ZIP file.
+# The list is either JSON or CSV, see the batch module for the format
+@app.route('/batch', methods=['POST'])
+def batch_post():
+    constants = get_constants()
+
+    try:
+        entries = batch.parse_request(request)
+        items = batch.create_items(entries, {gen.__name__: gen for gen in generators}, constants)
+    except batch.BatchError as e:
+        return jsonify(error=str(e)), 400
+
+    logger.info("Generating batch of {0} models for: {1}".format(len(items), request.remote_addr))
+
+    response = Response(stream_with_context(batch.generate_zip(items)), mimetype='application/zip')
+    response.headers['Content-Disposition'] = 'attachment; filename="Gridfinity batch.zip"'
+    return response
+
+# Handle GET requests for a model. The URL contains everything that determines the model, including the version,
+# and the same model always results in the same file, so the response can be cached forever. With a ".gz" suffix
+# (e.g. /models/baseplate.stl.gz) the model is sent as a gzip file instead
+@app.route('/models/<generator_id>.<export_format>', methods=['GET'])
+def model_get(generator_id, export_format):
+    compressed = export_format == "gz"
+    if compressed:
+        generator_id, _, export_format = generator_id.rpartition(".")
+
+    generatorsById = {gen.__name__: gen for gen in generators}
+    if generator_id not in generatorsById:
+        abort(404)
+
+    try:
+        constants = make_constants(model_urls.parse_grid(request.args['grid']) if 'grid' in request.args else None)
+        job = model_urls.job_from_url(generator_id, export_format, request.args, generatorsById, constants)
+    except batch.BatchError as e:
+        return jsonify(error=str(e)), 400
+
+    # Send the client to the canonical URL of the model, so each model is cached only once
+    url = model_urls.model_url(job, compressed)
+    if request.full_path != url:
+        return redirect(request.script_root + url, 308)
+
+    if compressed:
+        response = Response(load_encoded_model(job, "gzip"), mimetype='application/gzip')
+        response.headers.set('Content-Disposition', 'attachment', filename=job.download_name + ".gz")
+    else:
+        encoding = content_encoding.negotiate(request, export_format)
+        response = Response(load_encoded_model(job, encoding) if encoding else load_model(job),
+                            mimetype=MODEL_MIMETYPES.get(export_format, 'application/octet-stream'))
+        response.headers.set('Content-Disposition', 'attachment', filename=job.download_name)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+
+    data = response.get_data()
+    response.set_etag(hashlib.sha256(data).hexdigest())
+    response.cache_control.public = True
+    response.cache_control.max_age = MODEL_MAX_AGE_SECONDS
+    response.cache_control.immutable = True
+    return response.make_conditional(request, accept_ranges=True, complete_length=len(data))
+
+# Handle POST requests for "/preview". Accepts the same forms as "/", and returns the URL of a coarse mesh
+# of the model, which the web page shows next to the form
+@app.route('/preview', methods=['POST'])
+def preview_post():
+    constants = get_constants()
+
+    for gen in generators:
+        f = gen.get_form()
+        if gen.handles(request, f):
+            job = gen.get_job(f, constants)
+            downloadName = os.path.splitext(job.download_name)[0] + ".glb"
+            job = dataclasses.replace(job, export_format="glb", download_name=downloadName)
+
+            try:
+                cost_model.check(job)
+            except cost_model.CostLimitError as e:
+                return jsonify(error=str(e)), 422
+
+            return jsonify(url=request.script_root + model_urls.model_url(job))
+
+    return jsonify(error="No generator accepted the submitted form"), 400
+
+# Handle requests that could not be queued because the server is too busy
+@app.errorhandler(job_pool.QueueFullError)
+def queue_full(e):
+    response = make_response("The server is too busy to generate your model right now. Please try again in a moment.", 503)
+    response.headers['Retry-After'] = str(job_pool.RETRY_AFTER_SECONDS)
+    return response
+
+# Handle requests for models that are predicted to take too long to generate, or to need too much memory
+@app.errorhandler(cost_model.CostLimitError)
+def cost_limit(e):
+    return make_response("{0}. Please try a smaller model, or fewer compartments or holes.".format(e), 422)
+
+# Handle requests for models that could not be generated because the worker ran out of memory or stopped
+@app.errorhandler(job_pool.WorkerError)
+def worker_error(e):
+    logger.error("Generating a model failed: {0}".format(e))
+    return make_response("{0}. Please try again, or try a smaller model.".format(e), 500)
+
+# Handle requests for models that were aborted because they took too long, or because the client disconnected
+@app.errorhandler(job_pool.JobCancelledError)
+def job_cancelled(e):
+    return make_response("{0}. Please try a smaller model.".format(e), 500)
+
+# Handle GET requests for the help text of a topic. The texts only change with a new version, so clients may cache them
+@app.route('/help/<topic>', methods=['GET'])
+def help_get(topic):
+    text = help_provider.get_help(topic)
+    if text is None:
+        abort(404)
+
+    response = make_response(text)
+    response.cache_control.public = True
+    response.cache_control.max_age = HELP_MAX_AGE_SECONDS
+    response.add_etag()
+    return response.make_conditional(request)
+
+# Handle GET requests for "/metrics": timing of the generator stages and server statistics in the Prometheus text format
+@app.route('/metrics', methods=['GET'])
+def metrics_get():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.after_request
+def count_request(response):
+    # Label requests with the route instead of the path, to keep the number of distinct labels small
+    endpoint = request.url_rule.rule if request.url_rule else "unknown"
+    metrics.requests.inc(endpoint, request.method, response.status_code)
+    return response
+
+metrics.add_gauge("gfg_pool_jobs", "Jobs running or waiting in the worker pool", lambda: job_pool.pool.pending if job_pool.pool else 0)
+metrics.add_gauge("gfg_pool_capacity", "Maximum number of jobs running or waiting in the worker pool",
+                  lambda: job_pool.pool.workers + job_pool.pool.queue_size if job_pool.pool else 0)
+metrics.add_gauge("gfg_background_jobs", "Background jobs that are queued, running or waiting to be downloaded", lambda: len(jobs.store.jobs))
+
 # From this StackOverflow answer: https://stackoverflow.com/a/41904558
 @contextmanager
 def add_to_path(p):
@@ -195,16 +458,46 @@ if __name__ == "__main__":
 
     logger = logging.getLogger('GFG')
 
+    # Configure the cache of generated models. A size of 0 disables caching
+    cacheDir = os.environ.get('ARTIFACT_CACHE_DIR', '/cache')
+    cacheSizeMb = int(os.environ.get('ARTIFACT_CACHE_SIZE_MB', 1024))
+    if cacheSizeMb > 0:
+        artifact_cache.configure(cacheDir, cacheSizeMb*1024*1024)
+
     try:
         generators = load_generators()
     except Exception as e:
         logger.error(f"Failed to load generators: {e}")
         exit(1)
 
+    # Run the generators in a pool of worker processes. 0 workers runs them in threads of the server process instead
+    numWorkers = int(os.environ.get('GENERATOR_WORKERS', os.cpu_count()))
+    queueSize = int(os.environ.get('GENERATOR_QUEUE_SIZE', 2*numWorkers))
+    memoryLimitMb = int(os.environ.get('GENERATOR_MEMORY_LIMIT_MB', 2048))
+    maxJobs = int(os.environ.get('GENERATOR_MAX_JOBS', 200))
+    maxRssMb = int(os.environ.get('GENERATOR_MAX_RSS_MB', 1536))
+    # Some of the workers are reserved for small models, so these stay quick while large models keep the others busy
+    fastWorkers = int(os.environ.get('GENERATOR_FAST_WORKERS', max(1, numWorkers // 4) if numWorkers > 1 else 0))
+    fastQueueSize = int(os.environ.get('GENERATOR_FAST_QUEUE_SIZE', 4*fastWorkers))
+    if fastWorkers >= numWorkers > 0:
+        logger.error("GENERATOR_FAST_WORKERS must be less than GENERATOR_WORKERS")
+        exit(1)
+    if numWorkers > 0:
+        job_pool.configure(numWorkers, queueSize, memoryLimitMb*1024*1024, maxJobs, maxRssMb*1024*1024, fastWorkers, fastQueueSize)
+
+    # Every running or queued job occupies a server thread, keep some spare threads to serve pages
+    numThreads = int(os.environ.get('SERVER_THREADS', max(6, numWorkers + queueSize + fastQueueSize + 4)))
+
     if debugMode:
+        # Pick up changes to templates and help texts without restarting
+        jinja_env.auto_reload = True
+        content_cache.check_modified = True
+        cache_pages = False
+
         logger.info("Started in debug mode")
         port = int(os.environ.get('PORT', portNum))
         app.run(debug=True, host='0.0.0.0', port=port)
     else:
         logger.info("Started in production mode")
-        waitress.serve(app, listen='*:' + str(portNum), threads=6)
\ No newline at end of file
+        # Keep reading from connections while their request is handled, so requests can tell when their client disconnects
+        waitress.serve(app, listen='*:' + str(portNum), threads=numThreads, channel_request_lookahead=CHANNEL_REQUEST_LOOKAHEAD)
\ No newline at end of file
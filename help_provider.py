@@ -1,45 +1,27 @@
 import os
 
-def get_size_help():
-    with open(os.path.dirname(__file__) + '/help_files/size_help.html', 'r') as reader:
-        return reader.read()
-    
-def get_magnet_help():
-    with open(os.path.dirname(__file__) + '/help_files/magnet_help.html', 'r') as reader:
-        return reader.read()
-    
-def get_stackinglip_help():
-    with open(os.path.dirname(__file__) + '/help_files/stackinglip_help.html', 'r') as reader:
-        return reader.read()
-    
-def get_labeltab_help():
-    with open(os.path.dirname(__file__) + '/help_files/labeltab_help.html', 'r') as reader:
-        return reader.read()
-    
-def get_exportformat_help():
-    with open(os.path.dirname(__file__) + '/help_files/export_format_help.html', 'r') as reader:
-        return reader.read()
-    
-def get_scoopramp_help():
-    with open(os.path.dirname(__file__) + '/help_files/scoopramp_help.html', 'r') as reader:
-        return reader.read()
-    
-def get_compartment_help():
-    with open(os.path.dirname(__file__) + '/help_files/compartment_help.html', 'r') as reader:
-        return reader.read()
-    
-def get_holey_shape_help():
-    with open(os.path.dirname(__file__) + '/help_files/holey_shape_help.html', 'r') as reader:
-        return reader.read()
+import content_cache
 
-def get_holey_size_help():
-    with open(os.path.dirname(__file__) + '/help_files/holey_size_help.html', 'r') as reader:
-        return reader.read()
-    
-def get_holey_keepout_help():
-    with open(os.path.dirname(__file__) + '/help_files/holey_keepout_help.html', 'r') as reader:
-        return reader.read()
-    
-def get_holey_gridspec_help():
-    with open(os.path.dirname(__file__) + '/help_files/holey_numholes_help.html', 'r') as reader:
-        return reader.read()
+# The help topics. The text of each topic is in help_files/<topic>_help.html. Fields of the forms refer to
+# a topic in their description, the page fetches the text when the help button is clicked
+TOPICS = (
+    "compartment",
+    "export_format",
+    "holey_keepout",
+    "holey_numholes",
+    "holey_shape",
+    "holey_size",
+    "labeltab",
+    "magnet",
+    "quality",
+    "scoopramp",
+    "size",
+    "stackinglip",
+)
+
+def get_help(topic):
+    """Return the help text of a topic, or None if there is no such topic"""
+    if topic not in TOPICS:
+        return None
+
+    return content_cache.read(os.path.dirname(__file__) + '/help_files/{0}_help.html'.format(topic))
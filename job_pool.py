@@ -0,0 +1,426 @@
+import logging
+import multiprocessing
+import os
+import resource
+import signal
+import threading
+
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+
+logger = logging.getLogger('POOL')
+
+# Suggested delay for clients that were turned away because the queue was full
+RETRY_AFTER_SECONDS = 10
+
+# The pool used to run generation jobs. Stays None (jobs run in threads of the server process) until configure() is called
+pool = None
+
+# The lanes of the pool. Small jobs run in the fast lane, which has workers of its own, so they don't have to wait
+# for the large jobs in the bulk lane
+FAST_LANE = "fast"
+BULK_LANE = "bulk"
+
+# Runs the jobs when no pool is configured. CadQuery is not thread-safe (its selector parser is shared), so
+# without worker processes the models are generated one at a time
+thread_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job")
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while all workers are busy and the queue is full"""
+
+class WorkerError(Exception):
+    """Raised for a job that needed more memory than allowed, or whose worker process stopped unexpectedly"""
+
+class JobCancelledError(Exception):
+    """Raised for a job that was aborted because nobody is waiting for its result anymore"""
+
+class DeadlineExceededError(JobCancelledError):
+    """Raised for a job that was aborted because it ran longer than its deadline"""
+
+# In a worker process: the tables shared with the pool, and the slot of the job that is running
+worker_slots = None
+current_slot = None
+
+# In a worker process: the address space it may use in bytes (0 for no limit), and how close to it a failing
+# job has to come to blame the failure on the limit
+address_limit = 0
+memory_margin = 0
+
+MEMORY_ERROR = "Generating the model needed more memory than the server allows"
+
+class SlotTables:
+    """Tables shared between the pool and its workers, with an entry for each slot of the pool: the PID of the
+       worker running the job in the slot (0 when it isn't running), and whether the job has to be aborted
+    """
+
+    def __init__(self, context, size):
+        self.pids = context.RawArray('i', size)
+        self.aborted = context.RawArray('b', size)
+
+def memory_usage():
+    """Return the address space and the resident set size (RSS) of this process in bytes, or zeros if unknown"""
+    try:
+        with open("/proc/self/statm") as reader:
+            size, resident = reader.read().split()[:2]
+    except OSError:
+        # Not on Linux
+        return 0, 0
+
+    return int(size) * resource.getpagesize(), int(resident) * resource.getpagesize()
+
+def address_space_peak():
+    """Return the largest address space this process has had in bytes, or 0 if unknown"""
+    try:
+        with open("/proc/self/status") as reader:
+            for line in reader:
+                if line.startswith("VmPeak:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    return 0
+
+def near_memory_limit(peakBefore):
+    """Return whether the job that is running came close to the memory limit of the worker. peakBefore is
+       the address space peak from before the job, a job that didn't exceed it is judged by its current use
+    """
+    if not address_limit:
+        return False
+
+    peak = address_space_peak()
+    used = peak if peak > peakBefore else memory_usage()[0]
+    return address_limit - used < memory_margin
+
+def on_abort_signal(signum, frame):
+    # The pool signals the worker after marking the job as aborted. The job may have finished in the meantime,
+    # in which case the signal is meant for a job that is gone and is ignored
+    if current_slot is not None and worker_slots.aborted[current_slot]:
+        raise JobCancelledError("Generating the model was cancelled")
+
+def on_deadline_signal(signum, frame):
+    raise DeadlineExceededError("Generating the model took longer than the server allows")
+
+def init_worker(memory_limit, slots):
+    """Prepare a freshly started worker process by loading the generators, so the generator
+       objects sent to it can be unpickled. Then limit the memory it may use
+    """
+    global worker_slots, address_limit, memory_margin
+    worker_slots = slots
+    signal.signal(signal.SIGUSR1, on_abort_signal)
+    signal.signal(signal.SIGALRM, on_deadline_signal)
+
+    import gfg_main
+    gfg_main.logger = logging.getLogger('GFG')
+    gfg_main.load_generators()
+
+    if memory_limit:
+        # Everything loaded so far takes a lot of address space already, so the limit is on top of that
+        address_limit = memory_usage()[0] + memory_limit
+        memory_margin = memory_limit // 4
+        resource.setrlimit(resource.RLIMIT_AS, (address_limit, address_limit))
+
+def run_job(slot, deadline, fn, *args):
+    """Run a job in a worker process, and return its result together with the RSS of the worker afterwards.
+       The job is interrupted when its deadline (in seconds, 0 for none) passes or when the pool aborts it.
+       Python only handles the signals between calls into OpenCascade, so a long operation finishes first
+    """
+    global current_slot
+    current_slot = slot
+    worker_slots.pids[slot] = os.getpid()
+    peak = address_space_peak()
+    try:
+        # The job may have been aborted while it was waiting
+        if worker_slots.aborted[slot]:
+            raise JobCancelledError("Generating the model was cancelled")
+
+        if deadline:
+            signal.setitimer(signal.ITIMER_REAL, deadline)
+
+        result = fn(*args)
+    except MemoryError:
+        raise WorkerError(MEMORY_ERROR)
+    except JobCancelledError:
+        raise
+    except Exception:
+        # OpenCascade rarely reports a failed allocation as such. It fails further on instead, often with
+        # an invalid shape ("Null TopoDS_Shape"). A job that got close to the limit most likely ran into it
+        if near_memory_limit(peak):
+            raise WorkerError(MEMORY_ERROR)
+        raise
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        current_slot = None
+        worker_slots.pids[slot] = 0
+
+    return result, memory_usage()[1]
+
+class JobFuture(Future):
+    """Future of the result of a job in the pool, which is running as long as the job in the executor is running"""
+
+    def __init__(self, lane, slot, deadline, fn, args):
+        super().__init__()
+        self.lane = lane
+        self.slot = slot
+        self.deadline = deadline
+        self.fn = fn
+        self.args = args
+        self.executor_future = None
+        self.attempts = 0
+        self.aborted = False
+
+    def running(self):
+        return self.executor_future is not None and self.executor_future.running() and not self.done()
+
+class JobPool:
+    """Runs jobs in a pool of worker processes. At most queue_size jobs are allowed to wait for
+       a free worker, additional jobs are refused.
+
+       OpenCascade fragments the heap of the workers, so they only grow. The workers are replaced by fresh ones
+       after about max_jobs jobs each, when one of them uses more than max_rss bytes after a job, and when one runs
+       out of memory or stops. Each job may use memory_limit bytes on top of what a worker uses after starting.
+
+       Every job occupies one of the slots of the pool while it is running or waiting. Through its slot,
+       a running job can be aborted without disturbing the other jobs of its worker
+    """
+
+    def __init__(self, name, workers, queue_size, memory_limit=0, max_jobs=0, max_rss=0):
+        self.name = name
+        self.workers = workers
+        self.queue_size = queue_size
+        self.memory_limit = memory_limit
+        self.max_jobs = max_jobs
+        self.max_rss = max_rss
+
+        # Use fresh processes instead of forking the (multi-threaded) server
+        self.context = multiprocessing.get_context("spawn")
+
+        # One slot for each running or waiting job
+        self.slot_tables = SlotTables(self.context, workers + queue_size)
+        self.free_slots = list(range(workers + queue_size))
+        self.pending = 0
+        self.lock = threading.Lock()
+
+        self.executor = self.start_executor()
+        self.executor_jobs = 0 # Jobs finished by the current executor
+
+    def start_executor(self):
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=self.context,
+                                   initializer=init_worker, initargs=(self.memory_limit, self.slot_tables))
+
+    def submit(self, fn, *args, deadline=0):
+        """Submit a job and return its future. The job is aborted when it runs longer than deadline
+           seconds (0 for no deadline). Raises QueueFullError if there is no room for it
+        """
+        with self.lock:
+            if not self.free_slots:
+                logger.warning("Job refused, the queue of the {0} lane is full".format(self.name))
+                raise QueueFullError()
+
+            slot = self.free_slots.pop()
+            self.pending += 1
+
+        self.slot_tables.pids[slot] = 0
+        self.slot_tables.aborted[slot] = 0
+
+        future = JobFuture(self.name, slot, deadline, fn, args)
+        try:
+            self.start(future)
+        except Exception:
+            self.release(future)
+            raise
+
+        future.add_done_callback(self.release)
+        return future
+
+    def abort(self, future):
+        """Abort a job whose result is no longer needed. A waiting job is dropped, a running job is
+           interrupted. Its future then fails with JobCancelledError
+        """
+        if future.done() or future.aborted:
+            return
+
+        future.aborted = True
+        self.slot_tables.aborted[future.slot] = 1
+        if future.executor_future.cancel():
+            return
+
+        # Either the job is running, or its worker will notice that it was aborted when it starts it
+        pid = self.slot_tables.pids[future.slot]
+        if pid:
+            try:
+                os.kill(pid, signal.SIGUSR1)
+            except ProcessLookupError:
+                pass
+
+    def start(self, future):
+        """Hand a job to the current executor"""
+        with self.lock:
+            executor = self.executor
+
+        try:
+            executorFuture = executor.submit(run_job, future.slot, future.deadline, future.fn, *future.args)
+        except BrokenProcessPool:
+            # A worker of this executor stopped, but the executor wasn't replaced yet
+            self.recycle(executor, "error")
+            return self.start(future)
+        except RuntimeError:
+            # The executor was replaced and shut down after it was picked. It is replaced with the lock held
+            # before it is shut down, so its replacement is in place already
+            with self.lock:
+                replaced = executor is not self.executor
+
+            if not replaced:
+                raise
+            return self.start(future)
+
+        future.attempts += 1
+        future.executor_future = executorFuture
+        executorFuture.add_done_callback(lambda f: self.finish(executor, future, f))
+
+    def finish(self, executor, future, executorFuture):
+        """Pass the result of a job on to its future, and replace the workers when necessary"""
+        try:
+            result, rss = executorFuture.result()
+        except BrokenProcessPool:
+            # All jobs of the executor fail when one of its workers stops, so it's unknown which job caused
+            # it. Give them all a second chance with fresh workers. With a memory limit, OpenCascade aborts
+            # the worker when an allocation fails, so that is the likely cause
+            self.recycle(executor, "memory" if self.memory_limit else "error")
+            if future.attempts == 1 and not future.aborted:
+                try:
+                    self.start(future)
+                except Exception as ex:
+                    # This runs in a callback of the executor, where nobody would see the exception
+                    future.set_running_or_notify_cancel()
+                    future.set_exception(ex)
+            elif self.memory_limit:
+                future.set_running_or_notify_cancel()
+                future.set_exception(WorkerError("The worker generating the model stopped, it probably needed more memory than the server allows"))
+            else:
+                future.set_running_or_notify_cancel()
+                future.set_exception(WorkerError("The worker generating the model stopped unexpectedly"))
+            return
+        except WorkerError as ex:
+            # The worker ran out of memory, so its heap can't be trusted anymore
+            self.recycle(executor, "memory")
+            future.set_running_or_notify_cancel()
+            future.set_exception(ex)
+            return
+        except CancelledError:
+            # Aborted before it reached a worker
+            future.set_running_or_notify_cancel()
+            future.set_exception(JobCancelledError("Generating the model was cancelled"))
+            return
+        except Exception as ex:
+            future.set_running_or_notify_cancel()
+            future.set_exception(ex)
+            return
+
+        with self.lock:
+            if executor is self.executor:
+                self.executor_jobs += 1
+            jobsDone = self.executor_jobs
+
+        if self.max_rss and rss > self.max_rss:
+            logger.info("A worker uses {0} MB, replacing the workers".format(rss // (1024*1024)))
+            self.recycle(executor, "memory")
+        elif self.max_jobs and jobsDone >= self.max_jobs * self.workers:
+            self.recycle(executor, "jobs")
+
+        future.set_running_or_notify_cancel()
+        future.set_result(result)
+
+    def recycle(self, executor, reason):
+        """Replace the executor by one with fresh workers. Jobs that are already queued in the old executor still
+           run there, after which its workers exit
+        """
+        with self.lock:
+            if executor is not self.executor:
+                # Already replaced
+                return
+
+            self.executor = self.start_executor()
+            self.executor_jobs = 0
+
+        logger.info("Replaced the workers of the {0} lane ({1})".format(self.name, reason))
+        metrics.recycles.inc(reason)
+        executor.shutdown(wait=False)
+
+    def release(self, future):
+        """Free the slot of a job that is done"""
+        with self.lock:
+            self.free_slots.append(future.slot)
+            self.pending -= 1
+
+class LanePool:
+    """Runs jobs in lanes, each of which is a JobPool with its own workers and queue. Jobs for the fast lane
+       run in the bulk lane when the fast lane is full, but jobs for the bulk lane never take the workers
+       of the fast lane
+    """
+
+    def __init__(self, lanes):
+        self.lanes = lanes
+
+    @property
+    def workers(self):
+        return sum(lane.workers for lane in self.lanes.values())
+
+    @property
+    def queue_size(self):
+        return sum(lane.queue_size for lane in self.lanes.values())
+
+    @property
+    def pending(self):
+        return sum(lane.pending for lane in self.lanes.values())
+
+    def lane_workers(self, lane):
+        """Return the number of workers of a lane"""
+        return self.lanes[lane].workers if lane in self.lanes else 0
+
+    def submit(self, fn, *args, deadline=0, lane=BULK_LANE):
+        """Submit a job to a lane and return its future. Raises QueueFullError if there is no room for it"""
+        if lane == FAST_LANE and FAST_LANE in self.lanes:
+            try:
+                return self.lanes[FAST_LANE].submit(fn, *args, deadline=deadline)
+            except QueueFullError:
+                pass
+
+        return self.lanes[BULK_LANE].submit(fn, *args, deadline=deadline)
+
+    def abort(self, future):
+        self.lanes[future.lane].abort(future)
+
+def configure(workers, queue_size, memory_limit=0, max_jobs=0, max_rss=0, fast_workers=0, fast_queue_size=0):
+    """Run subsequent jobs in a pool of worker processes: fast_workers of them are reserved for the fast lane,
+       the others form the bulk lane. Each lane has a queue of its own. The memory limits are in bytes, 0 means no limit
+    """
+    global pool
+    lanes = {BULK_LANE: JobPool(BULK_LANE, workers - fast_workers, queue_size, memory_limit, max_jobs, max_rss)}
+    if fast_workers:
+        lanes[FAST_LANE] = JobPool(FAST_LANE, fast_workers, fast_queue_size, memory_limit, max_jobs, max_rss)
+
+    pool = LanePool(lanes)
+    for lane in lanes.values():
+        logger.info("Started {0} workers for the {1} lane, queue size {2}".format(lane.workers, lane.name, lane.queue_size))
+    return pool
+
+def submit(fn, *args, deadline=0, lane=BULK_LANE):
+    """Start running fn(*args) in a lane and return its future. When a pool is configured, the function and its
+       arguments must be picklable, and the job is aborted when it runs longer than deadline seconds.
+       Without a pool, there are no lanes and the deadline is not enforced
+    """
+    if pool is None:
+        return thread_executor.submit(fn, *args)
+
+    return pool.submit(fn, *args, deadline=deadline, lane=lane)
+
+def abort(future):
+    """Abort a job started with submit() whose result is no longer needed. Without a pool,
+       only a job that hasn't started yet can be aborted
+    """
+    if pool is None:
+        future.cancel()
+    else:
+        pool.abort(future)
@@ -0,0 +1,133 @@
+import logging
+import os
+import threading
+import time
+import uuid
+
+import job_pool
+
+from generators.common.model_download import is_model_cached, store_model, submit_model
+
+logger = logging.getLogger('JOBS')
+
+# Finished jobs are kept this long, waiting for their result to be downloaded
+JOB_TTL_SECONDS = 15*60
+
+# Clients poll the status of their jobs while they wait. A job that isn't polled for this many seconds is abandoned
+# (e.g. its browser tab was closed), and generating its model is aborted. 0 to never abandon jobs
+JOB_ABANDON_SECONDS = float(os.environ.get('JOB_ABANDON_SECONDS', 30))
+
+# How often abandoned jobs are looked for
+ABANDON_CHECK_SECONDS = 5
+
+class Job:
+    """A model that is generated in the background"""
+
+    def __init__(self, model_job):
+        self.id = uuid.uuid4().hex
+        self.model_job = model_job
+        self.created = time.monotonic()
+        self.polled = self.created
+        self.abandoned = False
+        self.finished = None
+        self.future = None
+        self.error = None
+
+    @property
+    def download_name(self):
+        return self.model_job.download_name
+
+    def status(self):
+        if self.error:
+            return "abandoned" if self.abandoned else "failed"
+        if self.finished:
+            return "done"
+        if self.future and self.future.running():
+            return "running"
+        return "queued"
+
+    def on_done(self, future):
+        """Store the result of the future in the artifact cache, called when generating the model is done.
+           The job itself doesn't keep the model, it is downloaded from the cache (or generated again if it was evicted)
+        """
+        try:
+            store_model(self.model_job, future.result())
+        except job_pool.JobCancelledError as ex:
+            if self.abandoned:
+                self.error = "The status of the job wasn't polled for {0:g} seconds, so generating the model was aborted".format(JOB_ABANDON_SECONDS)
+            else:
+                self.error = str(ex)
+        except Exception as ex:
+            logger.error("Job {0} failed: {1}".format(self.id, ex))
+            self.error = "Generating the model failed"
+
+        self.finished = time.monotonic()
+
+class JobStore:
+    """Keeps track of the background jobs, until they expire"""
+
+    def __init__(self):
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.watcher = None
+
+    def submit(self, model_job):
+        """Start generating a model in the background and return its job. A model that is already
+           cached is done immediately
+        """
+        job = Job(model_job)
+
+        # Cached models are counted in the metrics when they are downloaded
+        if is_model_cached(model_job):
+            job.finished = time.monotonic()
+        else:
+            job.future = submit_model(model_job)
+            job.future.add_done_callback(job.on_done)
+
+        with self.lock:
+            self.expire()
+            self.jobs[job.id] = job
+
+            if self.watcher is None:
+                self.watcher = threading.Thread(target=self.watch, name="jobs", daemon=True)
+                self.watcher.start()
+
+        logger.debug("Submitted job {0}: {1}".format(job.id, job.download_name))
+        return job
+
+    def get(self, job_id):
+        """Return the job with the provided id, or None if it doesn't exist (anymore)"""
+        with self.lock:
+            self.expire()
+            job = self.jobs.get(job_id)
+
+        if job:
+            job.polled = time.monotonic()
+
+        return job
+
+    def expire(self):
+        """Forget jobs that finished too long ago. Must be called with the lock held"""
+        now = time.monotonic()
+        expired = [job_id for job_id, job in self.jobs.items() if job.finished and now - job.finished > JOB_TTL_SECONDS]
+
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    def watch(self):
+        """Abort the jobs that were abandoned by their clients, for as long as the server runs"""
+        while True:
+            time.sleep(ABANDON_CHECK_SECONDS)
+            if not JOB_ABANDON_SECONDS:
+                continue
+
+            now = time.monotonic()
+            with self.lock:
+                abandoned = [job for job in self.jobs.values() if job.future and not job.finished and not job.abandoned and now - job.polled > JOB_ABANDON_SECONDS]
+
+            for job in abandoned:
+                logger.info("Job {0} was abandoned".format(job.id))
+                job.abandoned = True
+                job.future.abort()
+
+store = JobStore()
@@ -0,0 +1,109 @@
+import threading
+
+# Upper bounds of the buckets of the duration histograms, in seconds
+DURATION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+def format_labels(names, values):
+    if not names:
+        return ""
+
+    pairs = ['{0}="{1}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"')) for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}"
+
+class Counter:
+    """A value that only goes up, for each combination of label values"""
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *labelValues, amount=1):
+        with self.lock:
+            self.values[labelValues] = self.values.get(labelValues, 0) + amount
+
+    def render(self):
+        lines = ["# HELP {0} {1}".format(self.name, self.description), "# TYPE {0} counter".format(self.name)]
+        with self.lock:
+            for labelValues, value in sorted(self.values.items()):
+                lines.append("{0}{1} {2}".format(self.name, format_labels(self.labels, labelValues), value))
+        return lines
+
+class Gauge:
+    """A value that is read when the metrics are collected"""
+
+    def __init__(self, name, description, read):
+        self.name = name
+        self.description = description
+        self.read = read
+
+    def render(self):
+        return ["# HELP {0} {1}".format(self.name, self.description), "# TYPE {0} gauge".format(self.name),
+                "{0} {1}".format(self.name, self.read())]
+
+class Histogram:
+    """The distribution of observed values over a fixed set of buckets, for each combination of label values"""
+
+    def __init__(self, name, description, labels=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *labelValues):
+        with self.lock:
+            if labelValues not in self.values:
+                # The count of each bucket, the sum and the number of observations
+                self.values[labelValues] = [[0] * len(self.buckets), 0.0, 0]
+
+            entry = self.values[labelValues]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        lines = ["# HELP {0} {1}".format(self.name, self.description), "# TYPE {0} histogram".format(self.name)]
+        names = self.labels + ("le",)
+
+        with self.lock:
+            for labelValues, (counts, total, observations) in sorted(self.values.items()):
+                # Buckets are cumulative: each one counts all observations up to its bound
+                for bound, count in zip(self.buckets, counts):
+                    lines.append("{0}_bucket{1} {2}".format(self.name, format_labels(names, labelValues + (bound,)), count))
+                lines.append("{0}_bucket{1} {2}".format(self.name, format_labels(names, labelValues + ("+Inf",)), observations))
+                lines.append("{0}_sum{1} {2}".format(self.name, format_labels(self.labels, labelValues), round(total, 6)))
+                lines.append("{0}_count{1} {2}".format(self.name, format_labels(self.labels, labelValues), observations))
+        return lines
+
+# The metrics of the server. Gauges are added with add_gauge()
+stage_duration = Histogram("gfg_stage_duration_seconds", "Time spent in each stage of generating a model", ("generator", "stage"))
+requests = Counter("gfg_http_requests_total", "HTTP requests handled", ("endpoint", "method", "status"))
+models = Counter("gfg_models_total", "Models requested, by where they came from (cache or generated)", ("generator", "source"))
+errors = Counter("gfg_model_errors_total", "Models that failed to generate", ("generator",))
+rejected = Counter("gfg_rejected_jobs_total", "Jobs refused because the queue of the worker pool was full")
+cancelled = Counter("gfg_cancelled_jobs_total", "Jobs aborted because they ran past their deadline or were abandoned by their client", ("generator", "reason"))
+recycles = Counter("gfg_worker_recycles_total", "Times the worker processes were replaced by fresh ones, by reason", ("reason",))
+
+registry = [stage_duration, requests, models, errors, rejected, cancelled, recycles]
+
+def add_gauge(name, description, read):
+    registry.append(Gauge(name, description, read))
+
+def record_spans(generator_id, spans):
+    """Add the spans of a generated model to the stage histograms"""
+    for stage, seconds in spans:
+        stage_duration.observe(seconds, generator_id, stage)
+
+def render():
+    """Return all metrics in the Prometheus text format"""
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,62 @@
+import dataclasses
+
+from enum import Enum
+from urllib.parse import urlencode
+
+import batch
+from version import __version__
+from generators.common.model_export import DEFAULT_QUALITY, TESSELLATED_FORMATS
+
+# Settings that are left out of the URL, because the URL specifies them in another way
+EXCLUDED_SETTINGS = ("exportFormat",)
+
+def format_value(value):
+    """Format a setting the way convert_value() in the batch module reads it"""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, Enum):
+        return value.name
+    return str(value)
+
+def format_grid(grid):
+    return "{0},{1},{2}".format(float(grid.GRID_UNIT_SIZE_X_MM), float(grid.GRID_UNIT_SIZE_Y_MM), float(grid.HEIGHT_UNITSIZE_MM))
+
+def parse_grid(value):
+    """Parse the grid size (X, Y and Z) in a model URL"""
+    try:
+        x, y, z = (batch.convert_number(v) for v in value.split(","))
+    except ValueError:
+        raise batch.BatchError("Invalid grid '{0}'".format(value))
+
+    if min(x, y, z) <= 0:
+        raise batch.BatchError("Invalid grid '{0}'".format(value))
+
+    return (x, y, z)
+
+def model_url(job, compressed=False):
+    """Return the canonical URL of the model of a job. It contains the version of the creator and everything that
+       determines the model, with the settings in a fixed order and those that have their default value left out.
+       The URL of the compressed model ends in ".gz"
+    """
+    settings = job.generator.settings
+    defaults = type(settings)()
+
+    query = [("v", __version__), ("grid", format_grid(job.generator.grid))]
+    if job.export_format in TESSELLATED_FORMATS:
+        query.append(("quality", job.quality))
+
+    for field in dataclasses.fields(settings):
+        value = getattr(settings, field.name)
+        if field.name not in EXCLUDED_SETTINGS and format_value(value) != format_value(getattr(defaults, field.name)):
+            query.append((field.name, format_value(value)))
+
+    return "/models/{0}.{1}{2}?{3}".format(job.generator_id, job.export_format, ".gz" if compressed else "", urlencode(query))
+
+def job_from_url(generator_id, export_format, args, generators, constants):
+    """Create the job of the model at a model URL. The query contains the settings that differ from the default,
+       the grid size is taken from the constants. Raises BatchError if the URL is invalid
+    """
+    values = {name: value for name, value in args.items() if name not in ("v", "grid", "quality")}
+    entry = (generator_id, values, 1, export_format, args.get("quality", DEFAULT_QUALITY))
+
+    return batch.create_items([entry], generators, constants)[0].job
@@ -0,0 +1,28 @@
+import logging
+import os
+import sys
+
+import pytest
+
+# The modules of the server live in the root of the repository, and the generators are found relative to it
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+@pytest.fixture(scope="session")
+def server():
+    """The server module, with the generators loaded"""
+    import gfg_main
+    gfg_main.logger = logging.getLogger('GFG')
+    gfg_main.generators = gfg_main.load_generators()
+    gfg_main.app.config["WTF_CSRF_ENABLED"] = False
+    return gfg_main
+
+@pytest.fixture(scope="session")
+def generators(server):
+    """The loaded generators by id"""
+    return {gen.__name__: gen for gen in server.generators}
+
+@pytest.fixture
+def client(server):
+    return server.app.test_client()
@@ -0,0 +1,122 @@
+import io
+import zipfile
+
+import pytest
+
+import batch
+import cost_model
+import grid_constants
+import job_pool
+
+from generators.common import model_download
+
+@pytest.fixture
+def grid():
+    constants = grid_constants.Grid()
+    constants.recalculate()
+    return constants
+
+def test_convert_value_types():
+    assert batch.convert_value("yes", False) is True
+    assert batch.convert_value("off", True) is False
+    assert batch.convert_value("3", 1) == 3
+    assert batch.convert_value(3.0, 1) == 3
+    assert batch.convert_value("6.5", 1.0) == 6.5
+    assert batch.convert_value("stl", "3mf") == "stl"
+
+@pytest.mark.parametrize("value", ["2.5", 2.5, "inf", "-inf", "nan", float("inf"), "abc", [1], {"a": 1}, True])
+def test_convert_value_refuses_invalid_ints(value):
+    with pytest.raises((TypeError, ValueError)):
+        batch.convert_value(value, 1)
+
+@pytest.mark.parametrize("value", ["inf", "nan", 1e400, "abc", None])
+def test_convert_value_refuses_invalid_floats(value):
+    with pytest.raises((TypeError, ValueError)):
+        batch.convert_value(value, 1.0)
+
+def test_convert_value_enum_by_name_or_value(generators):
+    HoleShape = generators["holeybin"].settings.HoleShape
+    assert batch.convert_value("HEXAGON", HoleShape.CIRCLE) == "HEXAGON"
+    assert batch.convert_value("hexagon", HoleShape.CIRCLE) == "HEXAGON"
+    assert batch.convert_value("Square", HoleShape.CIRCLE) == "SQUARE"
+
+    with pytest.raises(ValueError):
+        batch.convert_value("TRIANGLE", HoleShape.CIRCLE)
+
+@pytest.mark.parametrize("values", [
+    {"compartmentsX": 0},
+    {"compartmentsX": -1},
+    {"sizeUnitsX": -3},
+    {"sizeUnitsZ": -2},
+    {"sizeUnitsX": 11},
+    {"sizeUnitsX": "inf"},
+    {"magnetHoleDiameter": 0},
+    {"magnetHoleDiameter": "nan"},
+    {"addStackingLip": "yes", "nope": 1},
+])
+def test_settings_out_of_range(generators, grid, values):
+    with pytest.raises(batch.BatchError):
+        batch.settings_from_values(generators["classicbin"].settings.Settings, values, grid)
+
+def test_settings_in_range(generators, grid):
+    s = batch.settings_from_values(generators["classicbin"].settings.Settings, {"sizeUnitsX": "2", "compartmentsX": 8, "addStackingLip": "no"}, grid)
+    assert (s.sizeUnitsX, s.compartmentsX, s.addStackingLip) == (2, 8, False)
+
+@pytest.mark.parametrize("data", [
+    {"generator": "baseplate"},
+    [{"generator": "baseplate", "settings": "x"}],
+    [{"generator": ["baseplate"]}],
+    [{"settings": {}}],
+])
+def test_parse_json_refuses_malformed_entries(data):
+    with pytest.raises(batch.BatchError):
+        batch.parse_json(data)
+
+@pytest.mark.parametrize("quantity", [0, 2.5, "2.5", "many", batch.MAX_QUANTITY + 1])
+def test_invalid_quantity(generators, grid, quantity):
+    with pytest.raises(batch.BatchError):
+        batch.create_items([("baseplate", {}, quantity, "stl", "auto")], generators, grid)
+
+def test_enum_and_name_are_the_same_model(generators, grid):
+    default = batch.create_items([("holeybin", {}, 1, "stl", "auto")], generators, grid)[0].job
+    named = batch.create_items([("holeybin", {"holeShape": "circle"}, 1, "stl", "auto")], generators, grid)[0].job
+    assert default.cache_key() == named.cache_key()
+
+def test_identical_entries_are_combined(generators, grid):
+    items = batch.create_items([("baseplate", {"sizeUnitsX": 1}, 2, "stl", "auto"), ("baseplate", {"sizeUnitsX": "1"}, 3, "stl", "auto")], generators, grid)
+    assert [item.quantity for item in items] == [5]
+
+def test_batch_endpoint(client):
+    response = client.post("/batch", json=[{"generator": "baseplate", "quantity": 2, "settings": {"sizeUnitsX": 1, "sizeUnitsY": 1}}])
+    assert response.status_code == 200
+
+    names = zipfile.ZipFile(io.BytesIO(response.data)).namelist()
+    assert "2x Baseplate 1x1.stl" in names
+
+@pytest.mark.parametrize("data", [
+    [{"generator": "baseplate", "settings": "x"}],
+    [{"generator": "classicbin", "settings": {"compartmentsX": 0}}],
+    [{"generator": "classicbin", "settings": {"sizeUnitsX": "inf"}}],
+    [{"generator": "baseplate", "quantity": 2.5}],
+])
+def test_batch_endpoint_refuses_invalid_entries(client, data):
+    assert client.post("/batch", json=data).status_code == 400
+
+@pytest.mark.parametrize("query", ["compartmentsX=0", "sizeUnitsX=-3", "sizeUnitsZ=-2", "compartmentsX=-1", "sizeUnitsX=inf"])
+def test_model_url_refuses_invalid_settings(client, query):
+    assert client.get("/models/classicbin.stl?" + query).status_code == 400
+
+def test_batch_runs_in_bulk_lane(generators, grid, monkeypatch):
+    lanes = []
+    def submit(fn, *args, deadline=0, lane=job_pool.BULK_LANE):
+        lanes.append(lane)
+        return job_pool.thread_executor.submit(fn, *args)
+    monkeypatch.setattr(job_pool, "submit", submit)
+
+    items = batch.create_items([("baseplate", {"sizeUnitsX": 1, "sizeUnitsY": 1}, 1, "stl", "auto")], generators, grid)
+
+    # On its own, the model would run in the fast lane
+    assert cost_model.check(items[0].job).seconds <= model_download.FAST_LANE_SECONDS
+
+    b"".join(batch.generate_zip(items))
+    assert lanes == [job_pool.BULK_LANE]
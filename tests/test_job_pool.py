@@ -0,0 +1,110 @@
+import time
+
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import batch
+import grid_constants
+import job_pool
+
+from generators.common import model_download
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = job_pool.JobPool(job_pool.BULK_LANE, 1, 1)
+    yield pool
+    pool.executor.shutdown(wait=True)
+
+class ReplacedExecutor:
+    """An executor that another thread replaces and shuts down right after it was picked"""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def submit(self, *args):
+        with self.pool.lock:
+            self.pool.executor = self.pool.start_executor()
+        raise RuntimeError("cannot schedule new futures after shutdown")
+
+def test_run_job(pool):
+    assert pool.submit(abs, -3).result(timeout=60) == 3
+    assert pool.pending == 0
+
+def test_queue_full(pool):
+    futures = [pool.submit(time.sleep, 1), pool.submit(time.sleep, 1)]
+
+    with pytest.raises(job_pool.QueueFullError):
+        pool.submit(time.sleep, 1)
+
+    for future in futures:
+        future.result(timeout=60)
+
+def test_deadline(pool):
+    with pytest.raises(job_pool.DeadlineExceededError):
+        pool.submit(time.sleep, 30, deadline=0.5).result(timeout=60)
+
+def test_abort(pool):
+    future = pool.submit(time.sleep, 30)
+    while not future.running():
+        time.sleep(0.05)
+
+    pool.abort(future)
+    with pytest.raises(job_pool.JobCancelledError):
+        future.result(timeout=60)
+
+def test_submit_while_executor_is_replaced(pool):
+    old = pool.executor
+    pool.executor = ReplacedExecutor(pool)
+
+    try:
+        assert pool.submit(abs, -4).result(timeout=60) == 4
+    finally:
+        old.shutdown(wait=True)
+
+def test_failed_retry_fails_the_job(pool, monkeypatch):
+    """When a worker stops, its jobs are started again. If that fails, the job fails instead of never finishing"""
+    future = job_pool.JobFuture(job_pool.BULK_LANE, 0, 0, abs, (-1,))
+    future.attempts = 1
+
+    def start(future):
+        raise RuntimeError("cannot schedule new futures after shutdown")
+    monkeypatch.setattr(pool, "start", start)
+
+    stopped = Future()
+    stopped.set_exception(BrokenProcessPool())
+    pool.finish(object(), future, stopped)
+
+    with pytest.raises(RuntimeError):
+        future.result(timeout=1)
+
+def fill_memory_and_fail(size):
+    data = bytearray(size)
+    raise ValueError("Null TopoDS_Shape")
+
+@pytest.fixture(scope="module")
+def limited_pool():
+    pool = job_pool.JobPool(job_pool.BULK_LANE, 1, 1, memory_limit=64*1024*1024)
+    yield pool
+    pool.executor.shutdown(wait=True)
+
+def test_memory_error(limited_pool):
+    with pytest.raises(job_pool.WorkerError):
+        limited_pool.submit(bytearray, 256*1024*1024).result(timeout=60)
+
+def test_error_near_memory_limit(limited_pool):
+    # OpenCascade fails with errors like this one when an allocation fails
+    with pytest.raises(job_pool.WorkerError):
+        limited_pool.submit(fill_memory_and_fail, 60*1024*1024).result(timeout=60)
+
+    with pytest.raises(ValueError):
+        limited_pool.submit(fill_memory_and_fail, 1024).result(timeout=60)
+
+def test_model_over_memory_limit(generators, limited_pool):
+    grid = grid_constants.Grid()
+    grid.recalculate()
+    job = batch.create_items([("classicbin", {"sizeUnitsX": 6, "sizeUnitsY": 6, "compartmentsX": 8, "compartmentsY": 8}, 1, "stl", "auto")], generators, grid)[0].job
+
+    with pytest.raises(job_pool.WorkerError, match="memory"):
+        limited_pool.submit(model_download.export_model, job.generator, job.export_format, job.quality).result(timeout=300)
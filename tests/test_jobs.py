@@ -0,0 +1,30 @@
+from concurrent.futures import Future
+
+import jobs
+import job_pool
+
+def cancelled_future():
+    future = Future()
+    future.set_exception(job_pool.JobCancelledError("Generating the model was cancelled"))
+    return future
+
+def test_abandoned_job():
+    job = jobs.Job(None)
+    job.abandoned = True
+    job.on_done(cancelled_future())
+
+    assert job.status() == "abandoned"
+    assert "polled" in job.error
+
+def test_cancelled_job_fails():
+    job = jobs.Job(None)
+    job.on_done(cancelled_future())
+
+    assert job.status() == "failed"
+
+def test_status_asks_for_polls(client):
+    form = {"baseplate": "", "sizeUnitsX": 4, "sizeUnitsY": 3, "exportFormat": "stl"}
+    status = client.post("/jobs", data=form).json
+
+    assert status["status"] in ("queued", "running")
+    assert status["poll_within"] == jobs.JOB_ABANDON_SECONDS
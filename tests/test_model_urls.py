@@ -0,0 +1,60 @@
+import time
+
+from urllib.parse import parse_qsl, urlsplit
+
+import pytest
+
+import batch
+import grid_constants
+import model_urls
+
+@pytest.fixture
+def grid():
+    constants = grid_constants.Grid()
+    constants.recalculate()
+    return constants
+
+def job_at(url, generators, grid):
+    parts = urlsplit(url)
+    generator_id, export_format = parts.path.rsplit("/", 1)[1].split(".", 1)
+    return model_urls.job_from_url(generator_id, export_format, dict(parse_qsl(parts.query)), generators, grid)
+
+@pytest.mark.parametrize("generator_id, values", [
+    ("classicbin", {"sizeUnitsX": 1, "sizeUnitsY": 1, "sizeUnitsZ": 3, "compartmentsY": 3}),
+    ("classicbin", {"compartmentsX": 5, "multiLabel": "true", "addScrewHoles": "false"}),
+    ("lightbin", {"sizeUnitsY": 1, "compartmentsY": 4}),
+    ("holeybin", {"holeShape": "hexagon", "holeSize": "4.5"}),
+    ("holeybin", {}),
+    ("baseplate", {"sizeUnitsX": 3}),
+])
+def test_model_url_reproduces_the_model(generators, grid, generator_id, values):
+    job = batch.create_items([(generator_id, values, 1, "stl", "auto")], generators, grid)[0].job
+    url = model_urls.model_url(job)
+
+    again = job_at(url, generators, grid)
+    assert again.cache_key() == job.cache_key()
+    assert model_urls.model_url(again) == url
+
+def test_parse_grid():
+    assert model_urls.parse_grid("42,42,7") == (42.0, 42.0, 7.0)
+
+    for value in ("42,42", "42,inf,7", "0,42,7", "a,b,c"):
+        with pytest.raises(batch.BatchError):
+            model_urls.parse_grid(value)
+
+def test_job_download_matches_model_url(client):
+    form = {"classicbin": "", "sizeUnitsX": 1, "sizeUnitsY": 1, "sizeUnitsZ": 3, "compartmentsX": 1, "compartmentsY": 3,
+            "addLabelRidge": "y", "magnetHoleDiameter": "6.5", "exportFormat": "stl"}
+    status = client.post("/jobs", data=form).json
+
+    while status["status"] in ("queued", "running"):
+        time.sleep(0.1)
+        status = client.get("/jobs/" + status["id"]).json
+
+    assert status["status"] == "done"
+    download = client.get(status["download"]).data
+
+    # The URL in the status is canonical already
+    response = client.get(status["url"])
+    assert response.status_code == 200
+    assert response.data == download
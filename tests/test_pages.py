@@ -0,0 +1,32 @@
+import re
+
+import pytest
+
+@pytest.fixture
+def csrf_client(server, monkeypatch):
+    monkeypatch.setitem(server.app.config, "WTF_CSRF_ENABLED", True)
+    return server.app.test_client()
+
+def test_index_is_shared(csrf_client):
+    response = csrf_client.get("/")
+    assert response.status_code == 200
+    assert response.cache_control.public
+    assert "Set-Cookie" not in response.headers
+    assert "Cookie" not in response.vary
+
+    # The grid of the client is filled in by the script of the page
+    csrf_client.set_cookie("gridspec", "42.0,42.0,12.0")
+    assert csrf_client.get("/").data == response.data
+
+def test_index_without_javascript(csrf_client):
+    form = {"baseplate": "", "sizeUnitsX": 1, "sizeUnitsY": 1, "exportFormat": "stl", "csrf_token": ""}
+
+    # The shared page has no CSRF token, the page that comes back does
+    response = csrf_client.post("/", data=form)
+    assert response.status_code == 200
+    assert response.cache_control.no_store
+
+    form["csrf_token"] = re.search(r'name="csrf_token" value="([^"]+)"', response.get_data(as_text=True)).group(1)
+    response = csrf_client.post("/", data=form)
+    assert response.status_code == 200
+    assert response.headers["Content-Disposition"].startswith("attachment")